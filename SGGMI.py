@@ -7,14 +7,29 @@ https://github.com/MagicGonads/sgg-mod-format
 __all__ = [
     #functions
         "main", "configure_globals", "start", "preplogfile", "cleanup",
-        "safeget", "safeset", "dictmap", "hashfile",
+        "safeget", "safeset", "dictmap", "hashfile", "hashfiles",
+        "stage_file", "stage_tree",
+        "cache_read", "cache_evict",
+        "manifest_entry", "manifest_load", "manifest_save", "restore_target",
+        "editstate_load", "editstate_save", "editstate_hash", "editstate_record",
+        "deployed_load", "deployed_save", "deploy_mods",
+        "modfile_lex", "modfile_load", "modfile_loadall",
+        "profile_span", "profile_report", "plan_edits",
+        "make_base_edits", "parallel_base_edits",
         "lua_addimport",
-        "xml_safeget", "xml_read", "xml_write", "xml_map", "xml_merge",
-        "sjson_safeget", "sjson_clearDNE", "sjson_read", "sjson_write",
-        "sjson_map", "sjson_merge", 
+        "xml_safeget", "xml_Styler", "xml_read", "xml_write", "xml_map",
+        "xml_stream", "xml_streammerge", "xml_merge",
+        "sjson_safeget", "sjson_visit", "sjson_compact", "sjson_clearDNE",
+        "sjson_read", "sjson_readrecords", "sjson_write", "sjson_map",
+        "sjson_merge", "sjson_compilepatch", "sjson_applypatch",
     #variables
         "configfile", "logfile_prefix", "logfile_suffix", "edited_suffix",
         "scopemods", "modsrel", "baserel", "editrel", "logsrel", "gamerel",
+        "cacherel", "cache_suffix", "cache_limit", "do_cache",
+        "sjson_lazy", "sjson_records", "xml_streaming", "manifest_name",
+        "editstate_name", "deployed_name", "modfile_cache_name", "deploy_hash",
+        "do_incremental", "jobs", "profile_run", "profile_dump",
+        "profile_memory", "do_plan",
         "do_log", "cfg_modify", "cfg_overwrite", "profile_use_special",
     #modules
         "logging","xml","sjson","yaml","hashlib",
@@ -27,16 +42,35 @@ __author__ = 'Andre Issa'
 # Dependencies
 
 import os, sys, stat
+import re
 import logging
+import logging.handlers
+import queue
+import atexit
+import time
+import threading
+import cProfile
+import tracemalloc
 import warnings
 import hashlib
+import pickle
+import json
+import io
+import traceback
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from getopt import getopt
 from pathlib import Path
-from shutil import copyfile, rmtree
+from shutil import copyfile, copymode, rmtree
 from datetime import datetime
 from collections import defaultdict
-from distutils.dir_util import copy_tree
-from distutils.errors import DistutilsFileError
+from collections.abc import Mapping
+from itertools import groupby
+
+try:
+    import fcntl # reflinks, only on Linux
+except ModuleNotFoundError:
+    fcntl = None
 
 ## Importer Config
 
@@ -69,6 +103,13 @@ logsrel = "Logs"
 logfile_prefix = "log-modimp "
 logfile_suffix = ".txt"
 edited_suffix = ".hash"
+cacherel = "Parse Cache"
+cache_suffix = ".pickle"
+cache_limit = 256 # MiB
+manifest_name = "manifest.json"
+editstate_name = "editstate.json"
+deployed_name = "deployed.json"
+modfile_cache_name = "modfiles.json"
 
 # Data Functionality
 
@@ -83,7 +124,7 @@ def safeget(data,key,default=DNE,skipnone=True):
                 ret = data[key]
                 return default if skipnone and ret is None else ret
         return default
-    if isinstance(data,dict):
+    if isinstance(data,Mapping):
             ret = data.get(key,default)
             return default if skipnone and ret is None else ret
     return default
@@ -108,11 +149,71 @@ def dictmap(indict,mapdict):
             return indict
     return mapdict
 
+## Parse caching
+
+cache_stamp = (__version__, sjson.__version__ if sjson else None)
+
+def cache_path(filename,reader):
+    digest = '-'.join(line.split('\t')[-1] for line in hashfile(filename).split('\n'))
+    return cachedir+'/'+reader.__name__+'/'+digest+cache_suffix
+
+def cache_read(filename,reader):
+    with profile_span('parse','op',filename):
+        return cache_readthrough(filename,reader)
+
+def cache_readthrough(filename,reader):
+    if not do_cache:
+        return reader(filename)
+    path = cache_path(filename,reader)
+    try:
+        with open(path,'rb') as f:
+            stamp,data = pickle.load(f)
+        if stamp == cache_stamp:
+            os.utime(path) # most recently used
+            return data
+    except Exception:
+        pass
+    data = reader(filename)
+    if data is not DNE:
+        Path(cachedir+'/'+reader.__name__).mkdir(parents=True, exist_ok=True)
+        tpath = path+'.'+str(os.getpid())
+        with open(tpath,'wb') as f:
+            pickle.dump((cache_stamp,data),f,pickle.HIGHEST_PROTOCOL)
+        os.replace(tpath,path)
+    return data
+
+def cache_evict():
+    if not os.path.isdir(cachedir):
+        return
+    entries = []
+    for root,dirs,files in os.walk(cachedir):
+        for file in files:
+            path = root+'/'+file
+            if path == cachedir+'/'+modfile_cache_name:
+                continue # not a parse, and cheap to keep
+            st = os.stat(path)
+            entries.append((st.st_mtime_ns,st.st_size,path))
+    total = sum(size for _,size,_ in entries)
+    for _,size,path in sorted(entries):
+        if total <= cache_limit*2**20:
+            break
+        os.remove(path)
+        total -= size
+
 ## LUA import statement adding
 
-def lua_addimport(base,path):
-    with open(base,'a') as basefile:
-        basefile.write("\nImport \"../"+path+"\"")
+def lua_addimport(base,*paths):
+    # every import of a target in one atomic write, the file is kept as is
+    # and the imports get the platform's line endings like an append would
+    with open(base,'rb') as basefile:
+        data = basefile.read()
+    imports = ''.join(os.linesep+"Import \"../"+path+"\"" for path in paths)
+    tpath = base+'.'+str(os.getpid())
+    with open(tpath,'wb') as tfile:
+        tfile.write(data)
+        tfile.write(imports.encode('utf-8'))
+    copymode(base,tpath)
+    os.replace(tpath,base)
 
 ## XML mapping
 
@@ -139,42 +240,119 @@ def xml_read(filename):
     except xml.ParseError:
         return DNE
 
+class xml_Styler():
+    """ applies the indentation styling to streamed ElementTree output """
+
+    special = re.compile('["<> \t]')
+    flush = 1024
+
+    def __init__(self,file,start=None):
+        self.file = file
+        self.out = [start] if start else []
+        self.line = []
+        self.count = 0
+        self.styling = False
+        self.cr = False
+        self.i = 0
+        self.q = True
+        self.p = ''
+
+    def write(self,chunk):
+        # same text as ElementTree.write(filename) read back in text mode
+        chunk = chunk.encode('ascii','xmlcharrefreplace').decode('ascii')
+        if self.cr and chunk[:1] == '\n':
+            chunk = chunk[1:]
+        if not chunk:
+            return
+        self.cr = chunk[-1] == '\r'
+        chunk = chunk.replace('\r\n','\n').replace('\r','\n')
+        lines = chunk.split('\n')
+        for line in lines[:-1]:
+            self.feed(line+'\n')
+            self.line = []
+            self.count = 0
+            self.styling = False
+        if lines[-1]:
+            self.feed(lines[-1])
+
+    def feed(self,part):
+        # a line is only styled once it has more than one non-blank
+        # character, from then on it is styled as it arrives
+        if not self.styling:
+            self.count += len(part.replace('\t','').replace(' ',''))
+            if self.count <= 1:
+                self.line.append(part)
+                return
+            self.styling = True
+            self.q = True
+            self.p = ''
+            part = ''.join(self.line)+part
+            self.line = []
+        self.style(part)
+
+    def close(self):
+        self.file.write(''.join(self.out))
+        self.out = []
+
+    def trim(self):
+        # drop the last character written, only the last chunk is ever trimmed
+        out = self.out
+        if out:
+            out[-1] = out[-1][:-1]
+            if not out[-1]:
+                out.pop()
+
+    def style(self,line):
+        out = self.out
+        search = self.special.search
+        i = self.i
+        q = self.q
+        p = self.p
+        n = len(line)
+        k = 0
+        while k < n:
+            s = line[k]
+            if s not in '"<> \t' and p not in ('<',' ',''):
+                # nothing happens until the next special character
+                m = search(line,k)
+                e = m.start() if m else n
+                out.append(line[k:e])
+                p = line[e-1]
+                k = e
+                continue
+            if s == '\"':
+                q = not q
+            if p == '<' and q:
+                if s == '/':
+                    i -= 1
+                    self.trim()
+                else:
+                    i += 1
+                out.append(p)
+            if s == '>' and p == '/' and q:
+                i -= 1
+            if p in (' ') or (s == '>' and p == '\"') and q:
+                out.append('\n' + '\t'*(i - (s == '/')))
+            if s not in (' ','\t','<') or not q:
+                out.append(s)
+            p = s
+            k += 1
+        self.i = i
+        self.q = q
+        self.p = p
+        if len(out) > self.flush:
+            self.file.write(''.join(out[:-1]))
+            del out[:-1]
+
 def xml_write(filename,content,start=None):
     if not isinstance(filename,str):
         return
     if not isinstance(content, xml.ElementTree):
         return
-    content.write(filename)
-
-    # Indentation styling
-    data = ""
-    if start:
-        data = start
-    with open(filename,'r') as file:
-        i = 0
-        for line in file:
-            nl = False
-            if len(line.replace('\t','').replace(' ','')) > 1:
-                q = True
-                p = ''
-                for s in line:
-                    if s == '\"':
-                        q = not q
-                    if p == '<' and q:
-                        if s == '/':
-                            i -= 1
-                            data = data[:-1]
-                        else:
-                            i += 1
-                        data+=p
-                    if s == '>' and p == '/' and q:
-                        i -= 1
-                    if p in (' ') or (s == '>' and p == '\"') and q:
-                        data += '\n' + '\t'*(i - (s == '/'))
-                    if s not in (' ','\t','<') or not q:
-                        data += s
-                    p=s
-    open(filename,"w").write(data)
+    with open(filename,'w') as file:
+        styler = xml_Styler(file,start)
+        content.write(styler,encoding='unicode')
+        styler.close()
 
 def xml_map(indata,mapdata):
     if mapdata is DNE:
@@ -190,13 +368,17 @@ def xml_map(indata,mapdata):
                 indata._setroot(root)
             return indata
         elif isinstance(mapdata,xml.Element):
-            mtags = dict()
-            for v in mapdata:
-                if not mtags.get(v.tag,False):
-                    mtags[v.tag]=True
-            for tag in mtags:
-                mes = mapdata.findall(tag)
-                ies = indata.findall(tag)
+            # one pass over each element's children, indexed by tag
+            mtags = defaultdict(list)
+            for me in mapdata:
+                mtags[me.tag].append(me)
+            itags = defaultdict(list)
+            for ie in indata:
+                if ie.tag in mtags:
+                    itags[ie.tag].append(ie)
+            removed = set()
+            for tag,mes in mtags.items():
+                ies = itags[tag]
                 for i,me in enumerate(mes):
                     ie = xml_safeget(ies,i)
                     if ie is DNE:
@@ -204,7 +386,7 @@ def xml_map(indata,mapdata):
                         continue
                     if me.get(xml_RESERVED_delete,None) \
                             not in {None,'0','false','False'}:
-                        indata.remove(ie)
+                        removed.add(ie)
                         continue
                     if me.get(xml_RESERVED_replace,None) \
                             not in {None,'0','false','False'}:
@@ -217,26 +399,186 @@ def xml_map(indata,mapdata):
                     ie.tail = xml_map(ie.tail,me.tail)
                     ie.attrib = xml_map(ie.attrib,me.attrib)
                     xml_map(ie,me)
+            if removed:
+                # rebuilt once rather than an O(n) remove per deletion
+                indata[:] = [ie for ie in indata if ie not in removed]
             return indata
         return mapdata
     else:
         return mapdata
     return mapdata
 
-def xml_merge(infile,mapfile):
+def xml_stream(source,maproot,sink,blocksize=65536):
+    # one pass of xml_map(source,maproot) serialised into sink the way
+    # ElementTree.write would, holding only the open elements in memory
+    escape_attrib = xml._escape_attrib
+    escape_cdata = xml._escape_cdata
+    falsy = {None,'0','false','False'}
+    out = []
+    def write(data):
+        out.append(data)
+        if len(out) >= 1024:
+            sink.write(''.join(out))
+            out.clear()
+    def index(element):
+        tags = defaultdict(list)
+        for child in element:
+            tags[child.tag].append(child)
+        return tags
+    def events():
+        parser = xml.XMLPullParser(('start','end','start-ns'))
+        with open(source,'rb') as file:
+            for block in iter(lambda: file.read(blocksize),b''):
+                parser.feed(block)
+                yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+    # frames: [element, tag index of its map or None, tag counters,
+    #          map element supplying text and tail or None, opened]
+    # deleted subtrees are None
+    stack = []
+    last = None
+    for event,elem in events():
+        if event == 'start-ns':
+            return False
+        if last is not None:
+            if last.tail:
+                write(escape_cdata(last.tail))
+            last = None
+        if event == 'start':
+            me = None
+            if stack:
+                parent = stack[-1]
+                if parent is None:
+                    stack.append(None)
+                    continue
+                pelem,mtags,counters,pme,opened = parent
+                if mtags is not None:
+                    i = counters.get(elem.tag,0)
+                    counters[elem.tag] = i+1
+                    me = xml_safeget(mtags.get(elem.tag,[]),i)
+                    if me is DNE:
+                        me = None
+                if me is not None \
+                        and me.get(xml_RESERVED_delete,None) not in falsy:
+                    stack.append(None)
+                    continue
+                if not opened:
+                    write('>')
+                    text = pelem.text if pme is None else pme.text
+                    if text:
+                        write(escape_cdata(text))
+                    parent[4] = True
+                del pelem[:-1]
+                attrib = elem.attrib
+                mtags = None
+                if me is None:
+                    pass
+                elif me.get(xml_RESERVED_replace,None) not in falsy:
+                    attrib = dict(me.attrib)
+                    del attrib[xml_RESERVED_replace]
+                else:
+                    attrib = dict(attrib)
+                    attrib.update(me.attrib)
+                    mtags = index(me)
+            else:
+                # the root keeps its own attributes, only children are mapped
+                attrib = elem.attrib
+                mtags = None if maproot is None else index(maproot)
+            write('<'+elem.tag)
+            for k,v in attrib.items():
+                write(' %s="%s"' % (k,escape_attrib(v)))
+            stack.append([elem,mtags,{},me,False])
+        else:
+            frame = stack.pop()
+            if frame is None:
+                del elem[:]
+                continue
+            elem,mtags,counters,me,opened = frame
+            text = elem.text if me is None else me.text
+            if mtags is not None:
+                for tag,mes in mtags.items():
+                    for m in mes[counters.get(tag,0):]:
+                        if not opened:
+                            write('>')
+                            if text:
+                                write(escape_cdata(text))
+                            opened = True
+                        write(xml.tostring(m,encoding='unicode'))
+            if opened:
+                write('</'+elem.tag+'>')
+            elif text:
+                write('>'+escape_cdata(text)+'</'+elem.tag+'>')
+            else:
+                write(' />')
+            if me is None:
+                last = elem
+            elif me.tail:
+                write(escape_cdata(me.tail))
+            del elem[:]
+    if last is not None and last.tail:
+        write(escape_cdata(last.tail))
+    sink.write(''.join(out))
+    return True
+
+def xml_streammerge(infile,start,*mapfiles):
+    maps = []
+    for mapfile in mapfiles:
+        if mapfile:
+            mapdata = cache_read(mapfile,xml_read)
+            if not isinstance(mapdata,xml.ElementTree):
+                continue
+            maproot = mapdata.getroot()
+            if any(e.tag[:1] == '{' for e in maproot.iter()):
+                return False
+            maps.append(maproot)
+    # one pass per map, only the last one is styled
+    maps = maps or [None]
+    passes = []
+    source = infile
+    try:
+        for n,maproot in enumerate(maps):
+            temp = infile+'.'+str(n)+'.part'
+            passes.append(temp)
+            if n == len(maps)-1:
+                with open(temp,'w') as file:
+                    styler = xml_Styler(file,start)
+                    if not xml_stream(source,maproot,styler):
+                        return False
+                    styler.close()
+            else:
+                with open(temp,'w',encoding='utf-8') as file:
+                    if not xml_stream(source,maproot,file):
+                        return False
+            source = temp
+        os.replace(source,infile)
+        return True
+    except xml.ParseError:
+        return False
+    finally:
+        for temp in passes:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+def xml_merge(infile,*mapfiles):
     start = ""
     with open(infile,'r') as file:
         for line in file:
             if line[:5] == "<?xml" and line[-3:] == "?>\n":                
                 start = line
                 break
-    indata = xml_read(infile)
-    if mapfile:
-        mapdata = xml_read(mapfile)
-    else:
-        mapdata = DNE
-    indata = xml_map(indata,mapdata)
-    xml_write(infile,indata,start)
+    if xml_streaming:
+        with profile_span('stream','op',infile):
+            if xml_streammerge(infile,start,*mapfiles):
+                return
+    indata = cache_read(infile,xml_read)
+    for mapfile in mapfiles:
+        if mapfile:
+            mapdata = cache_read(mapfile,xml_read)
+            with profile_span('map','op',mapfile):
+                indata = xml_map(indata,mapdata)
+    with profile_span('write','op',infile):
+        xml_write(infile,indata,start)
 
 ## SJSON mapping
 
@@ -246,6 +588,16 @@ if sjson is not None:
     sjson_RESERVED_append = "_append"
     sjson_RESERVED_replace = "_replace"
     sjson_RESERVED_delete = "_delete"
+    sjson_RESERVED_patch = "_patch"
+
+    sjson_TREEPATH_root = "::"
+    sjson_TREEPATH_delimiter = "::"
+    sjson_PATCH_delete = "Delete"
+    sjson_PATCH_update = "Update"
+    sjson_PATCH_append = "Append"
+
+    # records are mappings without being dicts
+    sjson_MAPPING = (dict,sjson.Record)
 
     def sjson_safeget(data,key):
         if isinstance(data,list):
@@ -253,133 +605,231 @@ if sjson is not None:
                 if key < len(data) and key >= 0:
                     return data[key]
             return DNE
-        if isinstance(data,OrderedDict):
+        if isinstance(data,sjson_MAPPING):
             return data.get(key,DNE)
         return DNE
 
-    def sjson_clearDNE(data):
-        if isinstance(data,OrderedDict):
-            for k,v in data.items():
-                if v is DNE:
-                    del data[k]
-                    continue
-                data[k] = sjson_clearDNE(v)
+    def sjson_visit(data,key):
+        # decode a lazily loaded container in place the first time it is needed
+        value = sjson_safeget(data,key)
+        if isinstance(value,sjson.Span):
+            value = data[key] = value.decode()
+        return value
+
+    def sjson_compact(data):
+        # drop the DNE placeholders of a single container in place,
+        # the scan is left to the C level and nothing is copied without them
         if isinstance(data,list):
-            L = []
-            for i,v in enumerate(data):
-                if v is DNE:
-                    continue
-                L.append(sjson_clearDNE(v))
-            data = L
+            if DNE in data:
+                data[:] = [v for v in data if v is not DNE]
+        elif isinstance(data,sjson_MAPPING):
+            if DNE in data.values():
+                for k in [k for k,v in data.items() if v is DNE]:
+                    del data[k]
+        return data
+
+    def sjson_clearDNE(data):
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node,sjson_MAPPING):
+                node = sjson_compact(node).values()
+            elif isinstance(node,list):
+                sjson_compact(node)
+            else:
+                continue
+            stack.extend([v for v in node
+                          if isinstance(v,(list,dict,sjson.Record))])
         return data
     
-    def sjson_read(filename):
+    def sjson_read(filename,lazy=False,records=False):
         try:
-            return sjson.loads(open(filename).read().replace('\\','\\\\'))
+            return sjson.loads(open(filename).read().replace('\\','\\\\'),
+                               lazy=lazy,records=records)
         except sjson.ParseException as e:
             alt_print(repr(e))
             return DNE
 
+    def sjson_readrecords(filename):
+        # its own reader, so the parse cache keeps both forms apart
+        return sjson_read(filename,records=True)
+
     def sjson_write(filename,content):
         if not isinstance(filename,str):
             return
-        if isinstance(content,OrderedDict):
-            content = sjson.dumps(content)
-        else:
-            content = ""
-        with open(filename, 'w') as f:
-            s = '{\n' + content + '}'
-            
-            # Indentation styling
-            p = ''
-            S = ''
-            for c in s:
-                if c in ("{","[") and p in ("{","["):
-                    S += "\n"
-                if c in ("}","]") and p in ("}","]"):
-                    S += "\n"
-                S += c
-                if p in ("{","[") and c not in ("{","[","\n"):
-                    S = S[:-1] + "\n" + S[-1]
-                if c in ("}","]") and p not in ("}","]","\n"):
-                    S = S[:-1] + "\n" + S[-1]
-                p = c
-            s = S.replace(", ","\n").split('\n')
-            i = 0
-            L = []
-            for S in s:
-                for c in S:
-                    if c in ("}","]"):
-                        i = i - 1
-                L.append("  "*i+S)
-                for c in S:
-                    if c in ("{","["):
-                        i=i+1
-            s = '\n'.join(L)
-            
-            f.write(s)
-
-    def sjson_map(indata,mapdata):
+        if not isinstance(content,sjson_MAPPING):
+            content = OrderedDict()
+        with open(filename,'w') as f:
+            sjson.dump(content,f,pretty=True)
+
+    def sjson_compilepatch(rules):
+        # trie node: [operations in rule order, {path segment: child node}]
+        trie = [[],OrderedDict()]
+        for rule in rules:
+            mode = sjson_safeget(rule,"Mode")
+            if mode not in {sjson_PATCH_delete,sjson_PATCH_update,sjson_PATCH_append}:
+                alt_warn("Unknown SJSON patch mode: "+repr(mode))
+                continue
+            path = sjson_safeget(rule,"TreePath")
+            if path is DNE or path == sjson_TREEPATH_root:
+                segments = []
+            else:
+                segments = path.split(sjson_TREEPATH_delimiter)
+            node = trie
+            for segment in segments:
+                node = node[1].setdefault(segment,[[],OrderedDict()])
+            node[0].append((mode,sjson_safeget(rule,"Value"),
+                            sjson_safeget(rule,"Key")))
+        return trie
+
+    def sjson_applypatch(indata,trie,deferred=None):
+        # a node's operations run before its children are visited,
+        # deleted nodes become DNE so list indices stay stable
+        # until the containers holding them are compacted at the end
+        root = [indata]
+        stack = [(root,0,trie)]
+        touched = [] if deferred is None else deferred
+        while stack:
+            parent,key,(ops,children) = stack.pop()
+            for mode,value,vkey in ops:
+                node = sjson_visit(parent,key)
+                if mode == sjson_PATCH_delete:
+                    parent[key] = DNE
+                    if parent is not root:
+                        touched.append(parent)
+                elif mode == sjson_PATCH_update:
+                    parent[key] = sjson_map(node,value,touched)
+                    if parent[key] is DNE and parent is not root:
+                        touched.append(parent)
+                elif isinstance(node,list):
+                    node.append(value)
+                elif isinstance(node,sjson_MAPPING) and vkey is not DNE:
+                    node[vkey] = value
+            node = sjson_visit(parent,key)
+            for segment,child in reversed(children.items()):
+                if isinstance(node,sjson_MAPPING):
+                    stack.append((node,segment,child))
+                elif isinstance(node,list):
+                    try:
+                        index = int(segment)
+                    except ValueError:
+                        continue
+                    if 0 <= index < len(node):
+                        stack.append((node,index,child))
+        if deferred is None:
+            for node in touched:
+                sjson_compact(node)
+        return root[0]
+
+    def sjson_map(indata,mapdata,deferred=None):
+        # only the nodes the map visits are merged, each is compacted once
+        # its children are done so list indices of the map stay stable;
+        # with deferred, the containers to compact are left to the caller
         if mapdata is DNE:
             return indata
-        if sjson_safeget(mapdata,sjson_RESERVED_sequence):
-            S = []
-            for k,v in mapdata.items():
-                try:
-                    d = int(k)-len(S)
-                    if d>=0:
-                        S.extend([DNE]*(d+1))
-                    S[int(k)]=v
-                except ValueError:
-                    continue
-            mapdata = S
-        if type(indata)==type(mapdata):
-            if sjson_safeget(mapdata,0) != sjson_RESERVED_append \
-                           or isinstance(mapdata,OrderedDict):
-                if isinstance(mapdata,list):
-                    if sjson_safeget(mapdata,0) == sjson_RESERVED_delete:
-                        return DNE
-                    if sjson_safeget(mapdata,0) == sjson_RESERVED_replace:
-                        del mapdata[0]
-                        return mapdata
-                    indata.expand([DNE]*(len(mapdata) - len(indata)))
-                    for k,v in enumerate(mapdata):
-                        indata[k] = sjson_map(sjson_safeget(indata,k),v)
+        root = [indata]
+        stack = [(root,0,mapdata)]
+        while stack:
+            parent,key,mapdata = stack.pop()
+            if parent is None:
+                if deferred is None:
+                    sjson_compact(key)
                 else:
-                    if sjson_safeget(mapdata,sjson_RESERVED_delete):
-                        return DNE
-                    if sjson_safeget(mapdata,sjson_RESERVED_replace):
-                        del mapdata[sjson_RESERVED_replace]
-                        return mapdata
-                    for k,v in mapdata.items():
-                        indata[k] = sjson_map(sjson_safeget(indata,k),v)
-                return indata
-            elif isinstance(mapdata,list):
-                for i in range(1,len(mapdata)):
-                    indata.append(mapdata[i])
-                return indata
-        else:
-            return mapdata
-        return mapdata
+                    deferred.append(key)
+                continue
+            indata = parent[key] if parent is root else sjson_visit(parent,key)
+            if isinstance(mapdata,sjson_MAPPING) \
+                    and sjson_RESERVED_patch in mapdata:
+                rules = mapdata.pop(sjson_RESERVED_patch)
+                touched = []
+                indata = sjson_applypatch(indata,sjson_compilepatch(rules),
+                                          touched)
+                stack.extend((None,node,None) for node in touched)
+                if not mapdata:
+                    parent[key] = indata
+                    continue
+            if sjson_safeget(mapdata,sjson_RESERVED_sequence):
+                S = []
+                for k,v in mapdata.items():
+                    try:
+                        d = int(k)-len(S)
+                        if d>=0:
+                            S.extend([DNE]*(d+1))
+                        S[int(k)]=v
+                    except ValueError:
+                        continue
+                mapdata = S
+                stack.append((None,S,None))
+            if type(indata)==type(mapdata) \
+                    or isinstance(indata,sjson_MAPPING) \
+                    and isinstance(mapdata,sjson_MAPPING):
+                if sjson_safeget(mapdata,0) != sjson_RESERVED_append \
+                               or isinstance(mapdata,sjson_MAPPING):
+                    if isinstance(mapdata,list):
+                        if sjson_safeget(mapdata,0) == sjson_RESERVED_delete:
+                            parent[key] = DNE
+                            continue
+                        if sjson_safeget(mapdata,0) == sjson_RESERVED_replace:
+                            del mapdata[0]
+                            parent[key] = mapdata
+                            continue
+                        indata.extend([DNE]*(len(mapdata) - len(indata)))
+                        stack.append((None,indata,None))
+                        stack.extend((indata,k,mapdata[k])
+                                     for k in reversed(range(len(mapdata)))
+                                     if mapdata[k] is not DNE)
+                    elif isinstance(mapdata,sjson_MAPPING):
+                        if sjson_safeget(mapdata,sjson_RESERVED_delete):
+                            parent[key] = DNE
+                            continue
+                        if sjson_safeget(mapdata,sjson_RESERVED_replace):
+                            del mapdata[sjson_RESERVED_replace]
+                            parent[key] = mapdata
+                            continue
+                        stack.append((None,indata,None))
+                        stack.extend((indata,k,v)
+                                     for k,v in reversed(mapdata.items()))
+                    else:
+                        parent[key] = mapdata
+                        continue
+                elif isinstance(mapdata,list):
+                    indata.extend(v for v in mapdata[1:] if v is not DNE)
+                parent[key] = indata
+            else:
+                parent[key] = mapdata
+        return root[0]
         
-    def sjson_merge(infile,mapfile):
-        indata = sjson_read(infile)
-        if mapfile:
-            mapdata = sjson_read(mapfile)
+    def sjson_merge(infile,*mapfiles):
+        reader = sjson_readrecords if sjson_records else sjson_read
+        if sjson_lazy:
+            # spans point into the file's own buffer, so bypass the cache;
+            # they are not parsed into records, so the two do not combine
+            indata = sjson_read(infile,True)
         else:
-            mapdata = DNE
-        indata = sjson_map(indata,mapdata)
-        indata = sjson_clearDNE(indata)
-        sjson_write(infile,indata)
+            indata = cache_read(infile,reader)
+        for mapfile in mapfiles:
+            if mapfile:
+                mapdata = cache_read(mapfile,reader)
+                # DNE is cleared as part of the map, so list indices
+                # of later maps refer to the cleaned list
+                with profile_span('map','op',mapfile):
+                    indata = sjson_map(indata,mapdata)
+        with profile_span('write','op',infile):
+            sjson_write(infile,indata)
 
 else:
     
     sjson_safeget = None
+    sjson_visit = None
+    sjson_compact = None
     sjson_clearDNE = None
     sjson_read = None
+    sjson_readrecords = None
     sjson_write = None
     sjson_map = None
     sjson_merge = None
+    sjson_compilepatch = None
+    sjson_applypatch = None
 
 # FILE/MOD CONTROL
 
@@ -402,22 +852,106 @@ class Signal():
                "("+self.truth.__repr__() + ',' + self.message.__repr__() + ')'
 
 hashes = ['md5']
-def hashfile(file,out=None,modes=hashes,blocksize=65536):
-    lines = []
-    for mode in modes:
-        hasher = hashlib.new(mode)
-        with open(file, 'rb') as afile:
-            buf = afile.read(blocksize)
-            while len(buf) > 0:
-                hasher.update(buf)
-                buf = afile.read(blocksize)
-            lines.append(mode+'\t'+hasher.hexdigest())
-    content = "\n".join(lines)
+
+def hash_new(mode):
+    # "name:size" picks a digest size, eg "blake2b:8" for a short fast digest
+    name,_,size = mode.partition(':')
+    if size:
+        return hashlib.new(name,digest_size=int(size))
+    return hashlib.new(name)
+
+def hashfile(file,out=None,modes=None,blocksize=65536):
+    with profile_span('hash','op',file):
+        return hashfile_pass(file,out,modes,blocksize)
+
+def hashfile_pass(file,out,modes,blocksize):
+    # every algorithm is fed from one pass over the file
+    if modes is None:
+        modes = hashes
+    hashers = [hash_new(mode) for mode in modes]
+    buf = bytearray(blocksize)
+    view = memoryview(buf)
+    with open(file, 'rb') as afile:
+        n = afile.readinto(buf)
+        while n:
+            for hasher in hashers:
+                hasher.update(view[:n])
+            n = afile.readinto(buf)
+    content = "\n".join(mode+'\t'+hasher.hexdigest()
+                        for mode,hasher in zip(modes,hashers))
     if out:
         with open(out, 'w') as ofile:
             ofile.write(content)
     return content
 
+def hashfiles(files,modes=None):
+    # hashlib releases the GIL on large updates, so threads hash in parallel
+    files = list(dict.fromkeys(files))
+    if len(files) < 2:
+        return {file:hashfile(file,modes=modes) for file in files}
+    with ThreadPoolExecutor() as pool:
+        return dict(zip(files,pool.map(lambda file: hashfile(file,modes=modes),files)))
+
+## File staging
+
+FICLONE = 0x40049409
+
+def stage_reflink(src,dst):
+    if fcntl is None:
+        return False
+    try:
+        with open(src,'rb') as sfile, open(dst,'wb') as dfile:
+            fcntl.ioctl(dfile.fileno(),FICLONE,sfile.fileno())
+        return True
+    except OSError:
+        # nothing is left behind for a hardlink or copy to trip over
+        if os.path.lexists(dst):
+            os.remove(dst)
+        return False
+
+def stage_file(src,dst,link=False):
+    # reflink, else hardlink if the copy is only ever read, else copy;
+    # the copy keeps the source mtime so a matching size and mtime means
+    # the destination is already up to date
+    st = os.stat(src)
+    try:
+        dt = os.stat(dst)
+    except FileNotFoundError:
+        pass
+    else:
+        if (dt.st_size,dt.st_mtime_ns) == (st.st_size,st.st_mtime_ns):
+            return False
+    tpath = dst+'.'+str(os.getpid())
+    if os.path.lexists(tpath):
+        os.remove(tpath)
+    if not stage_reflink(src,tpath):
+        if link:
+            try:
+                os.link(src,tpath)
+            except OSError:
+                pass
+            else:
+                os.replace(tpath,dst)
+                return True
+        copyfile(src,tpath)
+    os.utime(tpath,ns=(st.st_atime_ns,st.st_mtime_ns))
+    os.replace(tpath,dst)
+    return True
+
+def stage_tree(src,dst,link=False):
+    for root,dirs,files in os.walk(src):
+        reldir = root[len(src):].replace("\\","/")
+        Path(dst+reldir).mkdir(parents=True, exist_ok=True)
+        for file in files:
+            stage_file(root+'/'+file,dst+reldir+'/'+file,link)
+
+def stage_unlink(path):
+    # files are edited in place, which must not reach a hardlinked source
+    if os.stat(path).st_nlink > 1:
+        tpath = path+'.'+str(os.getpid())
+        copyfile(path,tpath)
+        os.replace(tpath,path)
+
 def is_subfile(filename,folder):
     if os.path.exists(filename):
         if os.path.commonprefix([filename, folder]) == folder:
@@ -440,6 +974,9 @@ def in_scope(filename,permit_DNE=False):
         if edit_in_scope:
             if os.path.commonprefix([filename, editdir]) == editdir:
                 return Signal(False,"InEdits")
+        if cache_in_scope:
+            if os.path.commonprefix([filename, cachedir]) == cachedir:
+                return Signal(False,"InCache")
         if os.path.commonprefix([filename, scopedir]) == scopedir:
             if os.path.isfile(filename):
                 return Signal(True,"FileInScope")
@@ -451,15 +988,14 @@ def alt_print(*args,**kwargs):
     if do_echo:
         return print(*args,**kwargs)
     if do_log:
-        tlog = logsdir+'/'+'temp-'+logfile_prefix+thetime()+logfile_suffix
-        f=open(tlog,'w')
-        print(file=f,*args,**kwargs)
-        f.close()
-        f=open(tlog,'r')
-        data=f.read()
-        f.close()
-        os.remove(tlog)
-        return logging.getLogger(__name__).info(data)
+        data = io.StringIO()
+        print(file=data,*args,**kwargs)
+        return logging.getLogger(__name__).info(data.getvalue())
+
+def alt_log(message='',**fields):
+    # fields: target, mod, priority, phase, duration
+    if do_log:
+        logging.getLogger(__name__).info(message,extra=fields)
 
 def alt_warn(message):
     warnings.warn(message,stacklevel = 2)
@@ -473,15 +1009,9 @@ def alt_input(*args,**kwargs):
         print(*args)
         return kwargs.get('default',None)
     if do_log:
-        tlog = logsdir+'/'+'temp-'+logfile_prefix+thetime()+logfile_suffix
-        f=open(tlog,'w')
-        print(file=f,*args)
-        f.close()
-        f=open(tlog,'r')
-        data=f.read()
-        f.close()
-        os.remove(tlog)        
-        logging.getLogger(__name__).info(data)
+        data = io.StringIO()
+        print(file=data,*args)
+        logging.getLogger(__name__).info(data.getvalue())
         if do_input:
             return input()
         return kwargs.get('default',None)
@@ -490,58 +1020,112 @@ def alt_exit(code=None):
     alt_input("Press any key to end program...")
     exit(code)
 
-def modfile_splitlines(body):
-    glines = map(lambda s: s.strip().split("\""),body.split("\n"))
-    lines = []
-    li = -1
-    mlcom = False
-    def gp(group,lines,li,mlcom,even):
-        if mlcom:
-            tgroup = group.split(modfile_mlcom_end,1)
-            if len(tgroup)==1: # still commented, carry on
-                even = not even
-                return (lines,li,mlcom,even)
-            else: # comment ends, if a quote, even is disrupted
-                even = False
-                mlcom = False
-                group = tgroup[1]
-        if even:
-            lines[li]+="\""+group+"\""
-        else:
-            tgroup = group.split(modfile_comment,1)
-            tline = tgroup[0].split(modfile_mlcom_start,1)
-            tgroup = tline[0].split(modfile_linebreak)
-            lines[li]+=tgroup[0] # uncommented line
-            for g in tgroup[1:]: # new uncommented lines
-                lines.append(g)
-                li+=1
-            if len(tline)>1: # comment begins
-                mlcom = True
-                lines,li,mlcom,even = gp(tline[1],lines,li,mlcom,even)
-        return (lines,li,mlcom,even)
-    for groups in glines:
-        even = False
-        li += 1
-        lines.append("")
-        for group in groups:
-            lines,li,mlcom,even = gp(group,lines,li,mlcom,even)
-            even = not even
-    return lines
-
-def modfile_tokenise(line):
-    groups = line.strip().split("\"")
-    for i,group in enumerate(groups):
-        if i%2:
-            groups[i] = [group]
+class modfile_Statement(list):
+    """ the tokens of one modfile statement and where they were read from """
+
+    def __init__(self,body,start=None,tokens=()):
+        super().__init__(tokens)
+        self.body = body
+        # a statement split without its offsets is lexed again from its
+        # start when they are needed
+        self.start = start
+        self.offsets = [] if start is None else None
+
+    def where(self,i=0):
+        # line and column are only worked out when something is reported
+        if self.offsets is None:
+            self.offsets = next(modfile_lexpieces(self.body,self.start)).offsets
+        offset = self.offsets[i]
+        line = self.body.count('\n',0,offset)+1
+        col = offset-self.body.rfind('\n',0,offset)
+        return str(line)+':'+str(col)
+
+def modfile_statement(body,pieces):
+    # yields the tokens of a statement's pieces if it has any; text pieces
+    # next to each other are one text, as a block comment is dropped from
+    # the middle of a word, and whitespace is only stripped at the ends
+    tokens = modfile_Statement(body)
+    runs = []
+    for offset,text,quoted in pieces:
+        if not quoted and runs and not runs[-1][0]:
+            runs[-1][2].append((len(runs[-1][1]),offset))
+            runs[-1][1] += text
         else:
-            groups[i] = group.replace(" ",modfile_delimiter)
-            groups[i] = groups[i].split(modfile_delimiter)
-    tokens = []
-    for group in groups:
-        for x in group:
-            if x != '':
-                tokens.append(x)
-    return tokens
+            runs.append([quoted,text,[(0,offset)]])
+    for i,(quoted,text,starts) in enumerate(runs):
+        if quoted:
+            if text:
+                tokens.append(text)
+                tokens.offsets.append(starts[0][1])
+            continue
+        lo = len(text)-len(text.lstrip()) if i == 0 else 0
+        hi = len(text.rstrip()) if i == len(runs)-1 else len(text)
+        k = 0
+        for m in modfile_splitter.finditer(text,lo,max(lo,hi)):
+            while k+1 < len(starts) and starts[k+1][0] <= m.start():
+                k += 1
+            tokens.append(m.group())
+            tokens.offsets.append(starts[k][1]+m.start()-starts[k][0])
+    if tokens:
+        yield tokens
+
+def modfile_lexpieces(body,pos):
+    # lexes the statement at pos piece by piece, yielding it and any
+    # statement a newline in one of its block comments ended, and returns
+    # where the next statement starts
+    pieces = []
+    while pos < len(body):
+        m = modfile_lexer.match(body,pos)
+        kind = m.lastgroup
+        pos = m.end()
+        if kind == 'text':
+            pieces.append((m.start(),m.group(),False))
+        elif kind == 'quote':
+            text = m.group('quoted')
+            if not m.group('close'):
+                text = text.rstrip()
+            pieces.append((m.start('quoted'),text,True))
+        elif kind == 'mlcom':
+            # a block comment can't end past a line comment in the part of
+            # the line it starts in, past that part quotes and line
+            # comments don't count, but each newline still ends a statement
+            m = modfile_mlcom_part.match(body,pos)
+            pos = m.end()
+            while m.group('end') is None and pos < len(body):
+                if body[pos] == '\n':
+                    yield from modfile_statement(body,pieces)
+                    pieces = []
+                m = modfile_mlcom_rest.match(body,pos+1)
+                pos = m.end()
+        elif kind != 'comment':
+            break
+    yield from modfile_statement(body,pieces)
+    return pos
+
+def modfile_lex(body):
+    # yields each statement, which end at newlines and linebreaks; quotes
+    # never span lines and an unclosed quote ends with its line, a line
+    # comment ends at the next quote as well
+    # only statements with block comments are lexed piece by piece, the
+    # others have their line comments cut up to the next quote and are
+    # split in one go
+    pos = 0
+    while pos < len(body):
+        m = modfile_simple.match(body,pos)
+        if m.group('mlcom') is not None:
+            pos = yield from modfile_lexpieces(body,pos)
+            continue
+        text = m.group('text')
+        if modfile_comment in text:
+            groups = text.split('"')
+            groups[::2] = [group.split(modfile_comment,1)[0]
+                           for group in groups[::2]]
+            text = '"'.join(groups)
+        tokens = [quoted or word for quoted,word
+                  in modfile_words.findall(text.strip()) if quoted or word]
+        if tokens:
+            yield modfile_Statement(body,pos,tokens)
+        pos = m.end()
 
 class Mod():
     """ modcode data structure """
@@ -566,6 +1150,7 @@ def modfile_startswith(tokens,keyword,n):
 def modfile_loadcommand(reldir,tokens,to,n,mode,cfg={},**load):
     for scopepath in to:
         path = scopedir+'/'+scopepath
+        modfile_depend(path,'path')
         if in_scope(path):
             args = [tokens[i::n] for i in range(n)]
             for i in range(len(args[-1])):
@@ -575,8 +1160,10 @@ def modfile_loadcommand(reldir,tokens,to,n,mode,cfg={},**load):
                 paths = []
                 num = -1
                 for source in sources:
+                    modfile_depend(modsdir+'/'+source,'path')
                     if os.path.isdir(modsdir+'/'+source):
                         tpath = []
+                        modfile_depend(source,'dir')
                         for file in os.scandir(source):
                             file = file.path.replace("\\","/")
                             if in_scope(file):
@@ -599,6 +1186,8 @@ def modfile_loadcommand(reldir,tokens,to,n,mode,cfg={},**load):
 
 def modfile_load(filename,echo=True):
     sig = is_subfile(filename,modsdir)
+    # an included folder is scanned, so it is its listing that counts
+    modfile_depend(filename,'dir' if sig.message == "SubDir" else 'modfile')
     if sig:
         prefix = os.path.commonprefix([filename,modsdir])
         relname = filename[len(prefix)+1:]
@@ -615,12 +1204,8 @@ def modfile_load(filename,echo=True):
         cfg = {}
         
         with file:    
-            for line in modfile_splitlines(file.read()):
-                tokens = modfile_tokenise(line) 
-                if len(tokens)==0:
-                    continue
-
-                elif modfile_startswith(tokens,KWRD_to,0):
+            for tokens in modfile_lex(file.read()):
+                if modfile_startswith(tokens,KWRD_to,0):
                     to = [s.replace("\\","/") for s in tokens[1:]]
                     if len(to) == 0:
                         to = default_target
@@ -631,19 +1216,23 @@ def modfile_load(filename,echo=True):
                             try:
                                 p = int(tokens[n])
                             except ValueError:
-                                pass
+                                modfile_warn("Invalid priority "+tokens[n]+" at "
+                                         +relname+":"+tokens.where(n))
                         else:
                             p = default_priority
                 if modfile_startswith(tokens,KWRD_include,1):
+                    # relative to the including modfile, like the commands
                     for s in tokens[1:]:
-                        modfile_load(reldir+"/"+
+                        modfile_load(modsdir+"/"+reldir+"/"+
                                      s.replace("\"","").replace("\\","/"),echo)
                 elif modfile_startswith(tokens,KWRD_deploy,1):
                     for s in tokens[1:]:
                         check = is_subfile(s,modsdir)
+                        modfile_depend(s,'path')
                         if check:
                             todeploy[s]=dictmap(todeploy.get(s,cfg),cfg)
                         elif check.message == "SubDir":
+                            modfile_depend(s,'dir')
                             for f in os.scandir(s):
                                 S=f.path.replace("\\","/")
                                 todeploy[S]=dictmap(todeploy.get(S,cfg),cfg)
@@ -659,24 +1248,160 @@ def modfile_load(filename,echo=True):
                         modfile_loadcommand(reldir,tokens[len(KWRD_sjson):],
                                         to,1,'sjson',cfg,priority=p)
                     else:
-                        alt_warn("SJSON module not found! Skipped command: "+line)
+                        modfile_warn("SJSON module not found! Skipped command at "
+                                 +relname+":"+tokens.where()+": "+" ".join(tokens))
                         
     elif sig.message == "SubDir":
         for file in os.scandir(filename):
             modfile_load(file.path.replace("\\","/"),echo)
 
+## Compiled modfile cache
+
+modfile_deps = None
+modfile_warnings = None
+
+def modfile_signature(path,kind,old=None):
+    # what the result of loading depends on: a modfile's content, a
+    # scanned folder's listing, or whether a path is a file or a folder
+    try:
+        st = os.stat(path)
+    except OSError:
+        return [kind,None]
+    isdir = stat.S_ISDIR(st.st_mode)
+    if kind == 'dir':
+        return [kind,isdir,st.st_mtime_ns]
+    if kind == 'modfile' and not isdir:
+        if old is not None and old[2:4] == [st.st_size,st.st_mtime_ns]:
+            return old
+        return [kind,isdir,st.st_size,st.st_mtime_ns,hashfile(path)]
+    return [kind,isdir]
+
+def modfile_depend(path,kind):
+    if modfile_deps is not None and path not in modfile_deps:
+        modfile_deps[path] = modfile_signature(path,kind)
+
+def modfile_warn(message):
+    # kept so that a replayed modfile warns like a loaded one
+    alt_warn(message)
+    if modfile_warnings is not None:
+        modfile_warnings.append(message)
+
+def modfile_refresh(deps):
+    # the deps with up to date signatures, or None if any of them changed
+    new = {}
+    for path,old in deps.items():
+        sig = modfile_signature(path,old[0],old)
+        if (sig[:2],sig[-1]) != (old[:2],old[-1]):
+            return None
+        new[path] = sig
+    return new
+
+def modfile_compile(filename,echo=True):
+    # loads one mod's modfile into fresh codes and todeploy and keeps what
+    # it added, so that it can be replayed while nothing it read changed
+    global codes, todeploy, modfile_deps, modfile_warnings
+    saved = codes,todeploy
+    codes,todeploy = defaultdict(list),{}
+    modfile_deps = {}
+    modfile_warnings = []
+    try:
+        modfile_load(filename,echo)
+        return {'deps':modfile_deps,'warnings':modfile_warnings,
+                'codes':[[key,[[mod.src,list(mod.data),mod.mode,mod.load]
+                               for mod in mods]]
+                         for key,mods in codes.items()],
+                'deploy':list(todeploy.items())}
+    finally:
+        codes,todeploy = saved
+        modfile_deps = modfile_warnings = None
+
+def modfile_replay(entry,echo=True,warn=True):
+    if echo:
+        for path,sig in entry['deps'].items():
+            if sig[0] == 'modfile' and sig[1] is False:
+                alt_print(path[len(modsdir)+1:])
+    if warn:
+        for message in entry.get('warnings',[]):
+            alt_warn(message)
+    for src,cfg in entry['deploy']:
+        todeploy[src]=dictmap(todeploy.get(src,cfg),cfg)
+    for key,mods in entry['codes']:
+        for src,data,mode,load in mods:
+            codes[key].append(Mod(src,tuple(data),mode,key,len(codes[key]),**load))
+
+def modfile_loadall(echo=True,save=True):
+    stamp = [__version__,sjson is not None,default_target,
+             scopedir,modsdir,deploydir]
+    cache = {}
+    if do_cache:
+        try:
+            with open(cachedir+'/'+modfile_cache_name,'r') as f:
+                cache = json.load(f)
+        except (OSError,ValueError):
+            pass
+        if cache.get('stamp') != stamp:
+            cache = {}
+    # the mods folder is only listed again when its listing changed
+    listing = modfile_signature(modsdir,'dir')
+    filenames = cache.get('mods')
+    if filenames is None or cache.get('listing') != listing:
+        filenames = [mod.path.replace("\\","/")+"/"+modfile
+                     for mod in os.scandir(modsdir)]
+    entries = cache.get('entries',{})
+    new = {}
+    for filename in filenames:
+        entry = entries.get(filename)
+        deps = modfile_refresh(entry['deps']) if entry else None
+        if deps is None:
+            entry = modfile_compile(filename,echo)
+            modfile_replay(entry,False,False)
+        else:
+            entry['deps'] = deps
+            modfile_replay(entry,echo)
+        new[filename] = entry
+    if do_cache and save:
+        with open(cachedir+'/'+modfile_cache_name,'w') as f:
+            json.dump({'stamp':stamp,'listing':listing,'mods':filenames,
+                       'entries':new},f)
+
 def is_edited(base):
     if os.path.isfile(editdir+'/'+base+edited_suffix):
         efile = open(editdir+'/'+base+edited_suffix,'r')
         data = efile.read()
         efile.close()
-        return data == hashfile(scopedir+'/'+base)
+        return data == editstate_hash(base)
     return False
 
-def deploy_mods():
-    for fs,cfg in todeploy.items():
-        Path(deploydir+"/"+"/".join(fs.split("/")[:-1])).mkdir(parents=True, exist_ok=True)
-        copyfile(modsdir+'/'+fs,deploydir+"/"+fs)
+def deploy_file(fs):
+    src = modsdir+'/'+fs
+    dst = deploydir+"/"+fs
+    if deploy_hash and os.path.isfile(dst):
+        st = os.stat(src)
+        if st.st_size == os.stat(dst).st_size and hashfile(src) == hashfile(dst):
+            # same content, the mtime is synced so the next run skips the hash
+            os.utime(dst,ns=(st.st_atime_ns,st.st_mtime_ns))
+            return False
+    return stage_file(src,dst,True)
+
+def deploy_mods(deployed=()):
+    for folder in {"/".join(fs.split("/")[:-1]) for fs in todeploy}:
+        Path(deploydir+"/"+folder).mkdir(parents=True, exist_ok=True)
+    # only files that changed since the last deploy are copied
+    with ThreadPoolExecutor() as pool:
+        changed = sum(pool.map(deploy_file,todeploy))
+    # files no mod references any more are removed
+    removed = 0
+    for fs in set(deployed).difference(todeploy):
+        if os.path.isfile(deploydir+"/"+fs):
+            os.remove(deploydir+"/"+fs)
+            removed += 1
+        folder = "/".join(fs.split("/")[:-1])
+        while folder and os.path.isdir(deploydir+"/"+folder) \
+                and not os.listdir(deploydir+"/"+folder):
+            os.rmdir(deploydir+"/"+folder)
+            folder = "/".join(folder.split("/")[:-1])
+    deployed_save(sorted(todeploy))
+    return changed,removed
 
 def sort_mods(base,mods):
     codes[base].sort(key=lambda x: x.load['priority'])
@@ -684,31 +1409,101 @@ def sort_mods(base,mods):
         mods[i].id=i
 
 def make_base_edits(base,mods,echo=True):
+    with profile_span(base,'target'):
+        make_target_edits(base,mods,echo)
+
+def make_target_edits(base,mods,echo):
     Path(basedir+"/"+"/".join(base.split("/")[:-1])).mkdir(parents=True, exist_ok=True)
-    copyfile(scopedir+'/'+base,basedir+"/"+base)
+    stage_file(scopedir+'/'+base,basedir+"/"+base)
+    stage_unlink(scopedir+'/'+base)
     if echo:
         i=0
         alt_print("\n"+base)
 
     try:
-        for mod in mods:
-            if mod.mode == 'lua':
-                lua_addimport(scopedir+'/'+base,mod.data[0])
-            elif mod.mode == 'xml':
-                xml_merge(scopedir+'/'+base,mod.data[0])
-            elif mod.mode == 'sjson':
-                sjson_merge(scopedir+'/'+base,mod.data[0])
+        # consecutive mods of the same mode are merged with one read/write
+        for mode,group in groupby(mods,key=lambda mod: mod.mode):
+            group = list(group)
+            started = time.perf_counter()
+            if mode == 'lua':
+                lua_addimport(scopedir+'/'+base,*(mod.data[0] for mod in group))
+            elif mode == 'xml':
+                xml_merge(scopedir+'/'+base,*(mod.data[0] for mod in group))
+            elif mode == 'sjson':
+                sjson_merge(scopedir+'/'+base,*(mod.data[0] for mod in group))
+            # the duration is of the whole merge each mod of the group was part of
+            duration = time.perf_counter()-started
+            for mod in group:
+                alt_log("merged",target=base,mod=mod.src,priority=mod.load['priority'],
+                        phase=mode,duration=duration)
             if echo:
-                k = i+1
-                for s in mod.src.split('\n'):
-                    i+=1
-                    alt_print(" #"+str(i)+" +"*(k<i)+" "*((k>=i)+5-len(str(i)))+s)
+                for mod in group:
+                    k = i+1
+                    for s in mod.src.split('\n'):
+                        i+=1
+                        alt_print(" #"+str(i)+" +"*(k<i)+" "*((k>=i)+5-len(str(i)))+s)
     except Exception as e:
-        copyfile(basedir+"/"+base,scopedir+'/'+base)
+        stage_file(basedir+"/"+base,scopedir+'/'+base)
         raise RuntimeError("Encountered uncaught exception while implementing mod changes") from e
     
     Path(editdir+"/"+"/".join(base.split("/")[:-1])).mkdir(parents=True, exist_ok=True)
-    hashfile(scopedir+'/'+base,editdir+'/'+base+edited_suffix)
+    editstate_record(base,hashfile(scopedir+'/'+base,editdir+'/'+base+edited_suffix))
+
+worker_globals = ('do_echo','do_log','do_input','do_cache','cache_limit',
+                  'sjson_lazy','sjson_records','xml_streaming','hashes',
+                  'logsdir','scopedir','basedir','editdir','modsdir',
+                  'deploydir','cachedir','profile_run','profile_memory')
+
+def edit_worker_init(state):
+    globals().update(state)
+    # records are handed back to the parent, which owns the log file
+    global log_buffer
+    log_buffer = logging.handlers.BufferingHandler(sys.maxsize)
+    logging.getLogger().handlers[:] = [log_buffer]
+    logging.getLogger().setLevel(logging.INFO)
+    # so are the spans of a profiled run
+    profile_spans.clear()
+    profile_open.clear()
+    if profile_memory:
+        tracemalloc.start()
+
+def edit_worker(base,mods,echo=True):
+    # output is collected so the parent can print each target in order
+    out = io.StringIO()
+    with redirect_stdout(out):
+        try:
+            make_base_edits(base,mods,echo)
+        except Exception:
+            error = traceback.format_exc()
+        else:
+            error = None
+    records = log_buffer.buffer[:]
+    log_buffer.buffer.clear()
+    spans = profile_spans[:]
+    profile_spans.clear()
+    return out.getvalue(),error,None if error else editstate.get(base),records,spans
+
+def parallel_base_edits(targets,echo=True):
+    state = {name:globals()[name] for name in worker_globals}
+    state['do_echo'] = True
+    failed = []
+    with ProcessPoolExecutor(jobs,initializer=edit_worker_init,
+                             initargs=(state,)) as pool:
+        futures = [(base,pool.submit(edit_worker,base,mods,echo))
+                   for base,mods in targets]
+        for base,future in futures:
+            output,error,entry,records,spans = future.result()
+            for record in records:
+                logging.getLogger(record.name).handle(record)
+            profile_spans.extend(spans)
+            if output:
+                alt_print(output,end='')
+            if error:
+                alt_print(error,end='')
+                failed.append(base)
+            elif entry is not None:
+                editstate[base] = entry
+    return failed
 
 def cleanup(folder=None,echo=True):
     if not os.path.exists(folder):
@@ -728,7 +1523,7 @@ def cleanup(folder=None,echo=True):
     path = folderpath[len(basedir)+1:]
     if os.path.isfile(scopedir+'/'+path):
         if is_edited(path):
-            copyfile(folderpath,scopedir+'/'+path)
+            stage_file(folderpath,scopedir+'/'+path)
         if echo:
             alt_print(path)
         os.remove(folderpath)
@@ -737,22 +1532,277 @@ def cleanup(folder=None,echo=True):
 
 def restorebase(echo=True):
     if not cleanup(basedir,echo):
+        stage_tree(basedir,scopedir)
+
+def restore_target(base,echo=True):
+    if os.path.isfile(basedir+'/'+base):
+        # a deleted live file is not restored, only its stale copy dropped
+        if os.path.isfile(scopedir+'/'+base) and is_edited(base):
+            stage_file(basedir+'/'+base,scopedir+'/'+base)
+        os.remove(basedir+'/'+base)
+        if echo:
+            alt_print(base)
+    if os.path.isfile(editdir+'/'+base+edited_suffix):
+        os.remove(editdir+'/'+base+edited_suffix)
+
+## Incremental manifest
+
+def manifest_entry(base,mods,digests={}):
+    # the unedited base is in the base cache while the edits are intact
+    if os.path.isfile(basedir+'/'+base) and is_edited(base):
+        basehash = hashfile(basedir+'/'+base)
+    else:
+        basehash = hashfile(scopedir+'/'+base)
+    return {'base':basehash,
+            'mods':[[mod.src,mod.mode,mod.load['priority'],
+                     [digests.get(modsdir+'/'+src) or hashfile(modsdir+'/'+src)
+                      for src in mod.src.split('\n')]]
+                    for mod in mods]}
+
+def manifest_load():
+    try:
+        with open(editdir+'/'+manifest_name,'r') as f:
+            return json.load(f)
+    except (OSError,ValueError):
+        return None
+
+def manifest_save(manifest):
+    with open(editdir+'/'+manifest_name,'w') as f:
+        json.dump(manifest,f,indent=1)
+
+def deployed_load():
+    try:
+        with open(editdir+'/'+deployed_name,'r') as f:
+            return json.load(f)
+    except (OSError,ValueError):
+        return []
+
+def deployed_save(deployed):
+    with open(editdir+'/'+deployed_name,'w') as f:
+        json.dump(deployed,f,indent=1)
+
+## Edit planning
+
+def plan_edits():
+    # what start would do with the current mods, without writing any file
+    if os.path.isdir(modsdir):
+        modfile_loadall(False,False)
+    manifest = manifest_load() if do_incremental else None
+    digests = hashfiles(modsdir+'/'+src for mods in codes.values()
+                        for mod in mods for src in mod.src.split('\n'))
+    def size(path):
         try:
-            copy_tree(basedir,scopedir)
-        except DistutilsFileError:
-            pass    
+            return os.path.getsize(path)
+        except OSError:
+            return None
+    targets = []
+    for base,mods in codes.items():
+        sort_mods(base,mods)
+        edited = is_edited(base)
+        # a target is cached when an incremental run would leave it alone
+        cached = manifest is not None and edited \
+                 and manifest.get(base) == manifest_entry(base,mods,digests)
+        # the unedited base is in the base cache while the edits are intact
+        if edited and os.path.isfile(basedir+'/'+base):
+            basesize = size(basedir+'/'+base)
+        else:
+            basesize = size(scopedir+'/'+base)
+        targets.append({'target':base,'cached':cached,'size':basesize,
+                        'mods':[{'src':mod.src.split('\n'),'mode':mod.mode,
+                                 'priority':mod.load['priority'],
+                                 'size':[size(modsdir+'/'+src)
+                                         for src in mod.src.split('\n')]}
+                                for mod in mods]})
+    return {'profile':folderprofile,'incremental':do_incremental,
+            'targets':targets,'deploy':sorted(todeploy)}
+
+## Edit state index
+
+def editstate_load():
+    try:
+        with open(editdir+'/'+editstate_name,'r') as f:
+            return json.load(f)
+    except (OSError,ValueError):
+        return {}
+
+def editstate_save(state):
+    with open(editdir+'/'+editstate_name,'w') as f:
+        json.dump(state,f)
+
+def editstate_record(base,digest):
+    st = os.stat(scopedir+'/'+base)
+    editstate[base] = [st.st_size,st.st_mtime_ns,digest]
+
+def editstate_hash(base):
+    # the live file is only re-hashed when its size or mtime changed
+    st = os.stat(scopedir+'/'+base)
+    entry = editstate.get(base)
+    if entry is not None and entry[:2] == [st.st_size,st.st_mtime_ns]:
+        return entry[2]
+    digest = hashfile(scopedir+'/'+base)
+    editstate[base] = [st.st_size,st.st_mtime_ns,digest]
+    return digest
+
+## Run profiling
+
+profile_spans = []
+# main thread spans that have not exited yet, each holding its peak traced
+# memory so far; traced memory is process-wide, so spans opened by other
+# threads don't measure it and can't reset its peak
+profile_open = []
+
+def profile_peak():
+    # fold the peak since the last span boundary into every open span
+    peak = tracemalloc.get_traced_memory()[1]
+    for span in profile_open:
+        span.peak = max(span.peak,peak)
+    tracemalloc.reset_peak()
+
+class profile_Span():
+    """ measures one phase, target or operation of a profiled run """
+
+    def __init__(self,name,kind,detail=None):
+        self.name = name
+        self.kind = kind
+        self.detail = detail
+
+    def __enter__(self):
+        self.peak = None
+        if tracemalloc.is_tracing() \
+                and threading.current_thread() is threading.main_thread():
+            profile_peak()
+            self.peak = tracemalloc.get_traced_memory()[0]
+            profile_open.append(self)
+        self.io = profile_io()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc_info):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        io = profile_io()
+        read = written = None
+        if io and self.io:
+            read = io[0]-self.io[0]
+            written = io[1]-self.io[1]
+        if self.peak is not None:
+            profile_peak()
+            profile_open.remove(self)
+        profile_spans.append({'name':self.name,'kind':self.kind,
+            'detail':self.detail,'start':self.wall,'wall':wall-self.wall,
+            'cpu':cpu-self.cpu,'read':read,'written':written,'peak':self.peak,
+            'pid':os.getpid(),'tid':threading.get_ident()})
+        return False
+
+class profile_Null():
+    """ stands in for profile_Span when the run is not profiled """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        return False
+
+profile_null = profile_Null()
+
+def profile_span(name,kind='phase',detail=None):
+    if profile_run:
+        return profile_Span(name,kind,detail)
+    return profile_null
+
+def profile_io():
+    # bytes read and written by the process so far, Linux only
+    try:
+        with open('/proc/self/io','r') as f:
+            fields = dict(line.split(':') for line in f)
+        return int(fields['rchar']),int(fields['wchar'])
+    except (OSError,KeyError,ValueError):
+        return None
+
+def profile_report(profiler=None):
+    # cpu time is of the whole process, so threads overlap within a span,
+    # and so is the memory traced while a span was open
+    if profile_memory:
+        tracemalloc.stop()
+    totals = {}
+    for span in profile_spans:
+        key = (span['kind'],span['name'])
+        total = totals.setdefault(key,{'count':0,'wall':0,'cpu':0,
+                                       'read':None,'written':None,'peak':None})
+        total['count'] += 1
+        total['wall'] += span['wall']
+        total['cpu'] += span['cpu']
+        for field in ('read','written'):
+            if span[field] is not None:
+                total[field] = (total[field] or 0)+span[field]
+        if span['peak'] is not None:
+            total['peak'] = max(total['peak'] or 0,span['peak'])
+    def size(n):
+        return '-' if n is None else str(n//1024)+'K'
+    kinds = ('phase','target','op')
+    alt_print("\nProfile (wall, cpu, read, written, peak traced memory):")
+    for kind,name in sorted(totals,key=lambda key: (kinds.index(key[0]),
+                                                    -totals[key]['wall'])):
+        total = totals[(kind,name)]
+        alt_print("  %-6s %-40s %5dx %9.3fs %9.3fs %9s %9s %9s" % (
+            kind,name[-40:],total['count'],total['wall'],total['cpu'],
+            size(total['read']),size(total['written']),size(total['peak'])))
+    if not profile_dump:
+        return
+    if profile_dump.endswith('.json'):
+        # Chrome trace, viewable in chrome://tracing or Perfetto
+        origin = min((span['start'] for span in profile_spans),default=0)
+        events = [{'name':span['name'],'cat':span['kind'],'ph':'X',
+                   'ts':(span['start']-origin)*1e6,'dur':span['wall']*1e6,
+                   'pid':span['pid'],'tid':span['tid'],
+                   'args':{k:span[k] for k in ('detail','cpu','read','written','peak')}}
+                  for span in profile_spans]
+        with open(profile_dump,'w') as f:
+            json.dump({'traceEvents':events},f)
+    elif profiler is not None:
+        profiler.dump_stats(profile_dump)
+    alt_print("Profile written to "+profile_dump)
 
 # Global Preprocessing
 
 def thetime():
     return datetime.now().strftime("%d.%m.%Y-%I.%M%p-%S.%f")
 
+class log_Formatter(logging.Formatter):
+    """ appends the structured fields of a record to its message """
+
+    fields = ('target','mod','priority','phase','duration')
+
+    def format(self,record):
+        text = super().format(record)
+        extra = []
+        for field in self.fields:
+            value = getattr(record,field,None)
+            if value is not None:
+                if field == 'duration':
+                    value = '%.6fs' % value
+                else:
+                    value = repr(value)
+                extra.append(field+'='+value)
+        if extra:
+            text += ' ['+' '.join(extra)+']'
+        return text
+
 def preplogfile():
-    if do_log:
+    # like logging.basicConfig, but records are written on a background
+    # thread so that logging never waits on the disk
+    root = logging.getLogger()
+    if do_log and not root.handlers:
         Path(logsdir).mkdir(parents=True, exist_ok=True)
-        logging.basicConfig(filename= \
-                            logsdir+"/"+logfile_prefix+thetime()+logfile_suffix,
-                            level = logging.INFO)
+        handler = logging.FileHandler(logsdir+"/"+logfile_prefix+thetime()+logfile_suffix)
+        handler.setFormatter(log_Formatter(logging.BASIC_FORMAT))
+        records = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records,handler)
+        root.addHandler(logging.handlers.QueueHandler(records))
+        root.setLevel(logging.INFO)
+        listener.start()
+        atexit.register(listener.stop)
     logging.captureWarnings(do_log and not do_echo)
 
 def update_scope(rel='..'):
@@ -782,6 +1832,30 @@ def configure_globals(condict={},flow=True):
     global hashes
     hashes = safeget(condict,'hashes',hashes)
 
+    global do_incremental
+    do_incremental = safeget(condict,'incremental',do_incremental)
+
+    global jobs
+    jobs = safeget(condict,'jobs',jobs)
+    if jobs < 1:
+        jobs = os.cpu_count() or 1
+
+    global do_cache, cache_limit
+    do_cache = safeget(condict,'parse_cache',do_cache)
+    cache_limit = safeget(condict,'parse_cache_limit',cache_limit)
+
+    global sjson_lazy
+    sjson_lazy = safeget(condict,'sjson_lazy',sjson_lazy)
+
+    global sjson_records
+    sjson_records = safeget(condict,'sjson_records',sjson_records)
+
+    global xml_streaming
+    xml_streaming = safeget(condict,'xml_streaming',xml_streaming)
+
+    global deploy_hash
+    deploy_hash = safeget(condict,'deploy_hash',deploy_hash)
+
     global  thisfile, localdir, localparent            
     thisfile = os.path.realpath(__file__).replace("\\","/")
     localdir = '/'.join(thisfile.split('/')[:-1])
@@ -813,11 +1887,13 @@ def configure_globals(condict={},flow=True):
     global default_target
     default_target = profile.get('default_target',default_target)
 
-    global scopemods, modsrel, modsabs, baserel, baseabs, editrel, editabs
+    global scopemods, modsrel, modsabs, baserel, baseabs, editrel, editabs, \
+           cacherel
     scopemods = safeget(profile,'folder_deployed',scopemods)
     modsrel = safeget(profile,'folder_mods',modsrel)
     baserel = safeget(profile,'folder_basecache',baserel)
     editrel = safeget(profile,'folder_editcache',editrel)
+    cacherel = safeget(profile,'folder_parsecache',cacherel)
 
     global basedir
     basedir = (scopedir+'/'+baserel).replace("\\","/")
@@ -833,6 +1909,13 @@ def configure_globals(condict={},flow=True):
             os.path.realpath(editdir) \
             , '').replace("\\","/")[:-1]
     
+    global cachedir
+    cachedir = (scopedir+'/'+cacherel).replace("\\","/")
+    if not os.path.isabs(cachedir):
+        cachedir = os.path.join( \
+            os.path.realpath(cachedir) \
+            , '').replace("\\","/")[:-1]
+    
     global modsdir
     modsdir = (scopedir+'/'+modsrel).replace("\\","/")
     if not os.path.isabs(modsdir):
@@ -847,9 +1930,9 @@ def configure_globals(condict={},flow=True):
             os.path.realpath(deploydir) \
             , '').replace("\\","/")[:-1]
     
-    global local_in_scope, base_in_scope, edit_in_scope, \
+    global local_in_scope, base_in_scope, edit_in_scope, cache_in_scope, \
            mods_in_scope, deploy_in_scope, game_has_scope
-    local_in_scope = base_in_scope = edit_in_scope \
+    local_in_scope = base_in_scope = edit_in_scope = cache_in_scope \
                      = mods_in_scope = deploy_in_scope = None
 
     game_has_scope = in_scope(scopedir).message == "DirInScope"
@@ -862,6 +1945,7 @@ def configure_globals(condict={},flow=True):
 
     base_in_scope = in_scope(basedir,True).message == "DirInScope"
     edit_in_scope = in_scope(editdir,True).message == "DirInScope"
+    cache_in_scope = in_scope(cachedir,True).message == "DirInScope"
     mods_in_scope = in_scope(basedir,True).message == "DirInScope"    
     deploy_in_scope = in_scope(deploydir,True).message == "DirInScope"
         
@@ -948,8 +2032,23 @@ MSG_CommandLineHelp = """
         disable input (input gets passed defaults)
     -c --config <relative file path>
         choose config file
+    -I --incremental
+        only rebuild files whose mods or base changed since the last run
+    -j --jobs <number of processes>
+        merge files in parallel (0 uses every core)
+    --profile-run
+        print where the time, I/O and memory of the run went
+    --profile-dump <file path>
+        also write a Chrome trace (.json) or a cProfile stats file
+    --profile-memory
+        also trace the peak memory of each phase, target and operation
+        (this slows the run down, so the times come out higher)
+    --plan <file path>
+        write the targets, mods and load order as JSON without changing
+        any file ("-" prints it)
     -H --hashes <space separated hash names>
         hashes used to compare files in edit cache (ie, "md5 sha1")
+        a digest size can follow the name (ie, "blake2b:8")
     -g --game <relative folder path>
         temporarily use a different game directory
     -p --profile <profile name>
@@ -968,6 +2067,34 @@ modfile_mlcom_end = ":-"
 modfile_comment = "::"
 modfile_linebreak = ";"
 modfile_delimiter = ","
+# a line comment takes precedence over a block comment it overlaps
+modfile_mlcom_open = ''.join('(?!'+'.'*i+re.escape(modfile_comment)+')'
+    for i in range(1,len(modfile_mlcom_start)))+re.escape(modfile_mlcom_start)
+modfile_stops = (re.escape(modfile_comment),modfile_mlcom_open,
+                 re.escape(modfile_linebreak))
+modfile_firsts = re.escape(''.join({modfile_comment[0],modfile_mlcom_start[0],
+                                    modfile_linebreak[0]}))
+modfile_lexer = re.compile('|'.join((
+    '(?P<text>(?:[^"\\n'+modfile_firsts+']+'
+        +'|(?!'+'|'.join(modfile_stops)+')[^"\\n])+)',
+    '(?P<quote>"(?P<quoted>[^"\\n]*)(?P<close>"?))',
+    '(?P<comment>'+re.escape(modfile_comment)+'[^"\\n]*)',
+    '(?P<mlcom>'+modfile_mlcom_open+')',
+    '(?P<newline>\\n)',
+    '(?P<linebreak>'+re.escape(modfile_linebreak)+')',
+)))
+# a statement without block comments, matched whole
+modfile_simple = re.compile('(?P<text>(?:[^"\\n'+modfile_firsts+']+'
+    +'|"[^"\\n]*"?|'+re.escape(modfile_comment)+'[^"\\n]*'
+    +'|(?!'+'|'.join(modfile_stops)+')[^"\\n])*)'
+    +'(?:(?P<mlcom>'+modfile_mlcom_open+')|'+re.escape(modfile_linebreak)
+    +'|\\n|\\Z)')
+modfile_mlcom_part = re.compile('(?:(?!'+re.escape(modfile_comment)
+    +')[^"\\n])*?(?P<end>'+re.escape(modfile_mlcom_end)+')|[^"\\n]*')
+modfile_mlcom_rest = re.compile('[^\\n]*?(?P<end>'
+    +re.escape(modfile_mlcom_end)+')|[^\\n]*')
+modfile_splitter = re.compile('[^ '+re.escape(modfile_delimiter)+']+')
+modfile_words = re.compile('"([^"]*)"?|([^" '+re.escape(modfile_delimiter)+']+)')
 
 KWRD_to = ["To"]
 KWRD_load = ["Load"]
@@ -989,6 +2116,7 @@ profile_template = {
     'folder_mods':None,
     'folder_basecache':None,
     'folder_editcache':None,
+    'folder_parsecache':None,
     }
 
 default_profiles = {
@@ -1019,47 +2147,122 @@ YML_framework = {
     'log_folder':None,
     'log_prefix':None,
     'log_suffix':None,
+    'parse_cache':True,
+    'parse_cache_limit':None,
+    'sjson_lazy':False,
+    'sjson_records':False,
+    'xml_streaming':False,
+    'deploy_hash':False,
+    'incremental':False,
+    'jobs':None,
 }
 
 # Main Process
 
 def start(*args,**kwargs):
 
-    configsetup(kwargs.get('predict',{}),kwargs.get('postdict',{}))
+    profile_spans.clear()
+    if profile_memory:
+        # tracing slows every allocation, so it is only done on request
+        tracemalloc.start()
+    with profile_span('config'):
+        configsetup(kwargs.get('predict',{}),kwargs.get('postdict',{}))
+    profiler = None
+    if profile_run:
+        if profile_dump and not profile_dump.endswith('.json'):
+            profiler = cProfile.Profile()
+            profiler.enable()
         
     global codes
     codes = defaultdict(list)
     global todeploy
     todeploy = {}
-
-    # remove anything in the base cache that is not in the edit cache
-    alt_print("Cleaning edits... (if there are issues validate/reinstall files)")
-    restorebase()
-
-    # remove the edit cache and base cache from the last run
-    def onerror(func, path, exc_info):
-        if not os.access(path, os.W_OK):
-            os.chmod(path, stat.S_IWUSR)
-            func(path)
+    global editstate
+    editstate = editstate_load()
+    deployed = deployed_load()
+
+    if do_plan:
+        plan = json.dumps(plan_edits(),indent=1)
+        if do_plan == '-':
+            print(plan)
         else:
-            raise
-    rmtree(editdir, onerror)
+            with open(do_plan,'w') as f:
+                f.write(plan)
+            alt_print("Plan written to "+do_plan)
+        return
+
+    # only targets whose manifest entry changed are restored and rebuilt
+    manifest = manifest_load() if do_incremental else None
+    if manifest is None:
+        # remove anything in the base cache that is not in the edit cache
+        alt_print("Cleaning edits... (if there are issues validate/reinstall files)")
+        with profile_span('restorebase'):
+            restorebase()
+
+        # remove the edit cache and base cache from the last run
+        def onerror(func, path, exc_info):
+            if not os.access(path, os.W_OK):
+                os.chmod(path, stat.S_IWUSR)
+                func(path)
+            else:
+                raise
+        with profile_span('wipe caches'):
+            rmtree(editdir, onerror)
+            rmtree(basedir, onerror)
     Path(editdir).mkdir(parents=True, exist_ok=True)
-    rmtree(basedir, onerror)
     Path(basedir).mkdir(parents=True, exist_ok=True)
     Path(modsdir).mkdir(parents=True, exist_ok=True)
     Path(deploydir).mkdir(parents=True, exist_ok=True)
+    Path(cachedir).mkdir(parents=True, exist_ok=True)
     
     alt_print("\nReading mod files...")
-    for mod in os.scandir(modsdir):
-        modfile_load(mod.path.replace("\\","/")+"/"+modfile)
+    with profile_span('modfile load'):
+        modfile_loadall()
 
-    deploy_mods()
+    with profile_span('deploy'):
+        changed,removed = deploy_mods(deployed)
+    alt_print("\nDeployed "+str(changed)+" changed file"+"s"*(changed!=1)
+              +", removed "+str(removed)+" unused file"+"s"*(removed!=1)+".")
     
     alt_print("\nModified files for "+folderprofile+" mods:")
-    for base, mods in codes.items():
-        sort_mods(base,mods)
-        make_base_edits(base,mods)
+    newmanifest = {}
+    targets = []
+    with profile_span('plan'):
+        digests = hashfiles(modsdir+'/'+src for mods in codes.values()
+                            for mod in mods for src in mod.src.split('\n'))
+        for base, mods in codes.items():
+            sort_mods(base,mods)
+            newmanifest[base] = manifest_entry(base,mods,digests)
+            if manifest is not None:
+                if manifest.get(base) == newmanifest[base] and is_edited(base):
+                    alt_print("\n"+base+" (unchanged)")
+                    continue
+                restore_target(base,False)
+            targets.append((base,mods))
+
+    failed = []
+    with profile_span('edits'):
+        if jobs > 1 and len(targets) > 1:
+            # a failed target is rolled back on its own, the others still finish
+            failed = parallel_base_edits(targets)
+            for base in failed:
+                del newmanifest[base]
+        else:
+            for base, mods in targets:
+                make_base_edits(base,mods)
+
+    with profile_span('finish'):
+        if manifest is not None:
+            removed = [base for base in manifest if base not in codes]
+            if removed:
+                alt_print("\nRestored files no longer modified:")
+            for base in removed:
+                restore_target(base)
+        manifest_save(newmanifest)
+        editstate_save({base:entry for base,entry in editstate.items()
+                        if base in codes and base not in failed})
+
+        cache_evict()
 
     bs = len(codes)
     ms = sum(map(len,codes.values()))
@@ -1067,6 +2270,15 @@ def start(*args,**kwargs):
     alt_print("\n"+str(bs)+" file"+("s are"," is")[bs==1]+" modified by"
               +" a total of "+str(ms)+" mod file"+"s"*(ms!=1)+".")
 
+    if profile_run:
+        if profiler is not None:
+            profiler.disable()
+        profile_report(profiler)
+
+    if failed:
+        raise RuntimeError("Encountered uncaught exceptions while implementing"
+                           +" mod changes for: "+", ".join(failed))
+
 def main_action(*args,**kwargs):
     try:
         start(*args,**kwargs)
@@ -1083,13 +2295,15 @@ def main(*args,**kwargs):
     predict = {}
     postdict = {}
     
-    opts,_ = getopt(args,'hmsoleic:g:p:S:H:',
+    opts,_ = getopt(args,'hmsoleiIc:g:p:S:H:j:',
                          ['config=','log_folder=','echo','input','special',
                           'log','log-prefix=','log-suffix=','profile=,help',
                           'special-set=','game=','modify','overwrite',
-                          '--hash='])
+                          'hashes=','incremental','jobs=','profile-run','profile-dump=',
+                          'profile-memory','plan='])
 
-    global cfg_modify, cfg_overwrite, profile_use_special, configfile, gamerel
+    global cfg_modify, cfg_overwrite, profile_use_special, configfile, gamerel, \
+           profile_memory, do_plan, profile_run, profile_dump
     
     for k,v in opts:
         if k in {'-h','--help'}:
@@ -1109,13 +2323,27 @@ def main(*args,**kwargs):
             postdict['echo']=False
         elif k in {'-i','--input'}:
             postdict['input']=False
+        elif k in {'-I','--incremental'}:
+            postdict['incremental']=True
+        elif k in {'-j','--jobs'}:
+            postdict['jobs']=int(v)
+        elif k == '--profile-run':
+            profile_run = True
+        elif k == '--profile-dump':
+            profile_run = True
+            profile_dump = v
+        elif k == '--profile-memory':
+            profile_run = True
+            profile_memory = True
+        elif k == '--plan':
+            do_plan = v
         elif k in {'-c','--config'}:
             configfile = v
         elif k in {'-g','--game'}:
             gamerel = v
         elif k in {'-p','--profile'}:
             postdict['profile']=v
-        elif k in {'-p','--profile'}:
+        elif k in {'-H','--hashes'}:
             postdict['hashes']=v.split(' ')
         elif k in {'-S','--special-set'}:
             if yaml is not None:
@@ -1127,6 +2355,18 @@ def main(*args,**kwargs):
     main_action(*args,predict=predict,postdict=postdict)
 
 do_log = True
+do_cache = True
+sjson_lazy = False
+sjson_records = False
+xml_streaming = False
+deploy_hash = False
+profile_run = False
+profile_dump = None
+profile_memory = False
+do_plan = None
+do_incremental = False
+jobs = 1
+editstate = {}
 cfg_modify = False
 cfg_overwrite = False
 profile_use_special = False
@@ -0,0 +1,422 @@
+"""Benchmarks for the parser, encoder and merge hot paths.
+
+Each benchmark runs against generated corpora at several sizes and reports
+throughput (MB/s and nodes/s), the peak traced allocation of a single run and
+how the run time scales with the input size.
+
+    python benchmark.py                         # run everything
+    python benchmark.py -k sjson -s 1000,8000   # subset, custom sizes
+    python benchmark.py -o new.json -b old.json # save and compare
+
+Results are written as JSON so that a later run can be compared against them
+with ``--baseline``; benchmarks that got slower than ``--threshold`` are
+reported and make the script exit with status 1.
+"""
+
+import argparse
+import atexit
+import copy
+import gc
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import sjson
+import SGGMI
+from SGGMI import xml, DNE
+
+DEFAULT_SIZES = (500, 2000, 8000)
+
+# Corpora
+
+
+def gen_helptext(n, rng):
+    """SJSON shaped like ``Game/Text/en/HelpText.en.sjson``."""
+    texts = []
+    for i in range(n):
+        text = OrderedDict()
+        text['Id'] = 'Text_%05d' % i
+        if rng.random() < 0.3:
+            text['InheritFrom'] = 'BaseText'
+        text['DisplayName'] = 'Name %d {$Keywords.Boon}' % i
+        text['Description'] = ' '.join(
+            rng.choice(('Deal', '{#BoldFormat}', 'damage', 'to', 'foes',
+                        'for', '{$TooltipData.Damage}', 'seconds.'))
+            for _ in range(rng.randint(4, 24)))
+        texts.append(text)
+    return OrderedDict([('Texts', texts)])
+
+
+def gen_units(n, rng):
+    """SJSON shaped like the unit/weapon data files: nested and numeric."""
+    units = []
+    for i in range(n):
+        unit = OrderedDict()
+        unit['Name'] = 'Unit%05d' % i
+        unit['InheritFrom'] = '1_BaseEnemy'
+        unit['Life'] = OrderedDict([
+            ('MaxHealth', rng.randint(10, 5000)),
+            ('DeathFx', 'EnemyDeathFx'),
+            ('HealthBarOffsetY', -rng.randint(50, 250)),
+        ])
+        unit['Thing'] = OrderedDict([
+            ('EditorOutlineDrawBounds', False),
+            ('Graphic', 'Unit%05dIdle' % i),
+            ('Points', [OrderedDict([('X', rng.randint(-64, 64)),
+                                     ('Y', rng.randint(-64, 64))])
+                        for _ in range(rng.randint(0, 6))]),
+            ('Scale', round(rng.uniform(0.5, 2.0), 2)),
+        ])
+        unit['Weapons'] = ['Weapon%d' % rng.randint(0, 99)
+                           for _ in range(rng.randint(0, 4))]
+        units.append(unit)
+    return OrderedDict([('Units', units)])
+
+
+def gen_sjson_map(data, rng):
+    """A mod map for ``data`` touching roughly a tenth of its records."""
+    key, records = next(iter(data.items()))
+    patch = OrderedDict([(SGGMI.sjson_RESERVED_sequence, True)])
+    for i in range(0, len(records), 10):
+        record = OrderedDict()
+        if rng.random() < 0.1:
+            record[SGGMI.sjson_RESERVED_delete] = True
+        else:
+            first = next(iter(records[i]))
+            record[first] = 'Modded%d' % i
+        patch[str(i)] = record
+    return OrderedDict([(key, patch)])
+
+
+def mark_dne(data, rng, ratio=0.2):
+    """Replace a fraction of the values below ``data``'s top level with
+    ``DNE``."""
+    stack = list(data.values())
+    while stack:
+        node = stack.pop()
+        items = enumerate(node) if isinstance(node, list) else node.items()
+        for k, v in list(items):
+            if rng.random() < ratio:
+                node[k] = DNE
+            elif isinstance(v, (list, OrderedDict)):
+                stack.append(v)
+    return data
+
+
+def gen_xml(n, rng, depth=1):
+    """An element tree with ``n`` elements, nested ``depth`` levels deep."""
+    root = xml.Element('Root')
+    parents = [root]
+    for i in range(n):
+        level = i % depth
+        parent = parents[level]
+        element = xml.SubElement(parent, 'Entry%d' % (i % 7), {
+            'Name': 'Entry%05d' % i,
+            'Value': str(rng.randint(0, 1000)),
+            'Flag': rng.choice(('true', 'false')),
+        })
+        del parents[level + 1:]
+        parents.append(element)
+    return xml.ElementTree(root)
+
+
+def gen_xml_map(tree, rng):
+    """A mod map for ``tree`` that edits a tenth of the root's children."""
+    root = xml.Element('Root')
+    seen = {}
+    for child in tree.getroot():
+        index = seen[child.tag] = seen.get(child.tag, -1) + 1
+        if index % 10:
+            continue
+        attrib = {'Value': str(rng.randint(0, 1000))}
+        if rng.random() < 0.1:
+            attrib[SGGMI.xml_RESERVED_delete] = 'true'
+        # earlier siblings of the same tag are matched positionally
+        while sum(1 for e in root if e.tag == child.tag) < index:
+            xml.SubElement(root, child.tag)
+        xml.SubElement(root, child.tag, attrib)
+    return xml.ElementTree(root)
+
+
+def gen_modfile(n, rng):
+    """A modfile with ``n`` lines of commands and comments."""
+    lines = []
+    for i in range(n):
+        kind = rng.random()
+        if kind < 0.15:
+            lines.append(':: comment %d about "quoted" things' % i)
+        elif kind < 0.2:
+            lines.append('-: a block comment')
+            lines.append('   spanning lines ; with a linebreak :-')
+        elif kind < 0.3:
+            lines.append('To "Scripts/RoomManager.lua"')
+        elif kind < 0.4:
+            lines.append('Load Priority %d' % rng.randint(0, 200))
+        elif kind < 0.7:
+            lines.append('Import "Scripts/Mod%d.lua" :: trailing' % i)
+        elif kind < 0.85:
+            lines.append('SJSON "Game/Text/en/Mod%d.sjson","b.sjson"' % i)
+        else:
+            lines.append('XML "Game/Mod%d.xml"; Deploy "Mod%d.png"' % (i, i))
+    return '\n'.join(lines)
+
+
+def count_sjson(data):
+    count = 0
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if isinstance(node, (OrderedDict, sjson.Record)):
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return count
+
+
+def count_xml(tree):
+    return sum(1 for _ in tree.iter())
+
+
+# Benchmarks
+#
+# A benchmark is called with (size, rng) and returns (nbytes, nodes, setup,
+# run): setup() builds fresh arguments outside of the timed region, since
+# the merge functions edit their input in place.
+
+
+def _sjson_loads(generator, **kwargs):
+    def bench(size, rng):
+        data = generator(size, rng)
+        text = sjson.dumps(data)
+        return (len(text), count_sjson(data), lambda: (text,),
+                lambda text: sjson.loads(text, **kwargs))
+    return bench
+
+
+def _sjson_dumps(generator, **kwargs):
+    def bench(size, rng):
+        data = generator(size, rng)
+        nbytes = len(sjson.dumps(data, **kwargs))
+        return (nbytes, count_sjson(data), lambda: (data,),
+                lambda data: sjson.dumps(data, **kwargs))
+    return bench
+
+
+def bench_sjson_map(size, rng):
+    data = gen_helptext(size, rng)
+    mapdata = gen_sjson_map(data, rng)
+    return (len(sjson.dumps(data)), count_sjson(data),
+            lambda: copy.deepcopy((data, mapdata)), SGGMI.sjson_map)
+
+
+def bench_sjson_clearDNE(size, rng):
+    data = mark_dne(gen_units(size, rng), rng)
+    return (len(sjson.dumps(SGGMI.sjson_clearDNE(copy.deepcopy(data)))),
+            count_sjson(data), lambda: (copy.deepcopy(data),),
+            SGGMI.sjson_clearDNE)
+
+
+def _xml_map(depth):
+    def bench(size, rng):
+        tree = gen_xml(size, rng, depth)
+        mapdata = gen_xml_map(tree, rng)
+        return (len(xml.tostring(tree.getroot())), count_xml(tree),
+                lambda: copy.deepcopy((tree, mapdata)), SGGMI.xml_map)
+    return bench
+
+
+def _xml_write(depth):
+    def bench(size, rng):
+        tree = gen_xml(size, rng, depth)
+        handle, path = tempfile.mkstemp(suffix='.xml')
+        os.close(handle)
+        atexit.register(os.remove, path)
+        return (len(xml.tostring(tree.getroot())), count_xml(tree),
+                lambda: (path, tree), SGGMI.xml_write)
+    return bench
+
+
+def bench_modfile(size, rng):
+    text = gen_modfile(size, rng)
+
+    def run(text):
+        return list(SGGMI.modfile_lex(text))
+    nodes = sum(len(tokens) for tokens in run(text))
+    return len(text), nodes, lambda: (text,), run
+
+
+BENCHMARKS = OrderedDict([
+    ('sjson.loads/helptext', _sjson_loads(gen_helptext)),
+    ('sjson.loads/units', _sjson_loads(gen_units)),
+    ('sjson.loads/units[stream]', _sjson_loads(gen_units, scanner='stream')),
+    ('sjson.loads/units[lazy]', _sjson_loads(gen_units, lazy=True)),
+    ('sjson.loads/helptext[records]',
+     _sjson_loads(gen_helptext, records=True)),
+    ('sjson.loads/units[records]', _sjson_loads(gen_units, records=True)),
+    ('sjson.dumps/helptext', _sjson_dumps(gen_helptext)),
+    ('sjson.dumps/units[pretty]', _sjson_dumps(gen_units, pretty=True)),
+    ('SGGMI.sjson_map/helptext', bench_sjson_map),
+    ('SGGMI.sjson_clearDNE/units', bench_sjson_clearDNE),
+    ('SGGMI.xml_map/wide', _xml_map(1)),
+    ('SGGMI.xml_map/deep', _xml_map(32)),
+    ('SGGMI.xml_write/wide', _xml_write(1)),
+    ('SGGMI.xml_write/deep', _xml_write(32)),
+    ('SGGMI.modfile_lex', bench_modfile),
+])
+
+
+# Measurement
+
+
+def measure(bench, size, repeat, seed):
+    """Best-of-``repeat`` timing plus one traced run for the memory peak."""
+    nbytes, nodes, setup, run = bench(size, random.Random(seed))
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        gc.collect()
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - start)
+    args = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    best = min(times)
+    return OrderedDict([
+        ('size', size),
+        ('bytes', nbytes),
+        ('nodes', nodes),
+        ('seconds', best),
+        ('median_seconds', sorted(times)[len(times) // 2]),
+        ('mb_per_s', nbytes / best / 1e6 if best else None),
+        ('nodes_per_s', nodes / best if best else None),
+        ('peak_bytes', peak),
+    ])
+
+
+def scaling_exponent(points):
+    """Least squares slope of log(seconds) over log(bytes).
+
+    1.0 means linear scaling, 2.0 quadratic."""
+    xs = [math.log(p['bytes']) for p in points if p['seconds'] > 0]
+    ys = [math.log(p['seconds']) for p in points if p['seconds'] > 0]
+    if len(xs) < 2:
+        return None
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    var = sum((x - mx) ** 2 for x in xs)
+    if not var:
+        return None
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var
+
+
+def compare(results, baseline, threshold):
+    """Yield (name, size, ratio) for every measurement that got slower."""
+    for name, result in results.items():
+        old = {p['size']: p for p in
+               baseline.get('benchmarks', {}).get(name, {}).get('points', ())}
+        for point in result['points']:
+            before = old.get(point['size'])
+            if before is None or not before['seconds']:
+                continue
+            ratio = point['seconds'] / before['seconds']
+            if ratio > 1 + threshold:
+                yield name, point['size'], ratio
+
+
+def fmt_bytes(n):
+    for unit in ('B', 'KiB', 'MiB'):
+        if n < 1024:
+            return '%.0f %s' % (n, unit)
+        n /= 1024
+    return '%.1f GiB' % n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the parser, encoder and merge hot paths.')
+    parser.add_argument('-s', '--sizes', default=','.join(map(str,
+                        DEFAULT_SIZES)), help='comma separated corpus sizes')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='timed runs per measurement (best is kept)')
+    parser.add_argument('-k', '--filter', action='append', default=[],
+                        help='only run benchmarks containing this string')
+    parser.add_argument('-o', '--output', help='write the results as JSON')
+    parser.add_argument('-b', '--baseline', help='JSON results to compare to')
+    parser.add_argument('-t', '--threshold', type=float, default=0.1,
+                        help='slowdown ratio reported as a regression')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-l', '--list', action='store_true',
+                        help='list the benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS
+             if not args.filter or any(f in name for f in args.filter)]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+    sizes = sorted(int(s) for s in args.sizes.split(',') if s)
+
+    results = OrderedDict()
+    print('%-30s %7s %10s %9s %12s %10s' % (
+        'benchmark', 'size', 'bytes', 'MB/s', 'nodes/s', 'peak'))
+    for name in names:
+        points = []
+        for size in sizes:
+            point = measure(BENCHMARKS[name], size, args.repeat, args.seed)
+            points.append(point)
+            print('%-30s %7d %10s %9.2f %12.0f %10s' % (
+                name, size, fmt_bytes(point['bytes']), point['mb_per_s'],
+                point['nodes_per_s'], fmt_bytes(point['peak_bytes'])))
+        exponent = scaling_exponent(points)
+        results[name] = OrderedDict([('points', points),
+                                     ('scaling', exponent)])
+        if exponent is not None:
+            print('%-30s scaling ~ n^%.2f' % ('', exponent))
+
+    report = OrderedDict([
+        ('meta', OrderedDict([
+            ('time', time.strftime('%Y-%m-%dT%H:%M:%S')),
+            ('python', platform.python_version()),
+            ('implementation', platform.python_implementation()),
+            ('platform', platform.platform()),
+            ('sggmi', SGGMI.__version__),
+            ('sjson', sjson.__version__),
+            ('sizes', sizes),
+            ('repeat', args.repeat),
+            ('seed', args.seed),
+        ])),
+        ('benchmarks', results),
+    ])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = list(compare(results, baseline, args.threshold))
+        for name, size, ratio in regressions:
+            print('REGRESSION %s [%d]: %.2fx slower' % (name, size, ratio))
+        if regressions:
+            status = 1
+        else:
+            print('no regressions over %d%%' % (args.threshold * 100))
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,20 @@
 # Mod Importer for SuperGiant Games' Games
 
-import os
+import os, sys
+import re
 from collections import defaultdict
 from pathlib import Path
 
 import logging
 from collections import OrderedDict
-from shutil import copyfile
+from shutil import copyfile, copymode
 from datetime import datetime
+from itertools import groupby
+from getopt import getopt
+import io
+import traceback
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
 
 import xml.etree.ElementTree as xml
 
@@ -21,8 +28,6 @@ except ModuleNotFoundError:
 
 ## Global Settings
 
-logging.basicConfig(filename="modimporter.log.txt",filemode='w')
-
 modsdir = "Mods"
 modsrel = ".."
 gamerel = ".."
@@ -35,12 +40,14 @@ mlcom_end = ":-"
 comment = "::"
 linebreak = ";"
 delimiter = ","
+jobs = 1
 
 modified = "MODIFIED"
 modified_modrep = " by Mod Importer @ "
 modified_lua = "-- "+modified+" "
 modified_xml = "<!-- "+modified+" -->"
 modified_sjson = "/* "+modified+" */"
+modified_tail = 256
 
 default_to = defaultdict(str)
 default_to.update({"Hades":["Scripts/RoomManager.lua"],
@@ -82,34 +89,42 @@ def safeget(data,key):
         return data.get(key,DNE)
     return DNE
 
-def clearDNE(data):
-    if isinstance(data,OrderedDict):
-        for k,v in data.items():
-            if v is DNE:
-                del data[k]
-                continue
-            data[k] = clearDNE(v)
+def compactDNE(data):
     if isinstance(data,list):
-        L = []
-        for i,v in enumerate(data):
-            if v is DNE:
-                continue
-            L.append(clearDNE(v))
-        data = L
+        if DNE in data:
+            data[:] = [v for v in data if v is not DNE]
+    elif isinstance(data,OrderedDict):
+        if DNE in data.values():
+            for k in [k for k,v in data.items() if v is DNE]:
+                del data[k]
     return data
 
-### LUA import statement adding
+def clearDNE(data):
+    stack = [data]
+    while stack:
+        node = compactDNE(stack.pop())
+        if isinstance(node,OrderedDict):
+            node = node.values()
+        elif not isinstance(node,list):
+            continue
+        stack.extend([v for v in node if isinstance(v,(list,OrderedDict))])
+    return data
 
-def addimport(base,path):
-    with open(base,'a',encoding='utf-8') as basefile:
-        basefile.write("\nImport "+"\""+modsrel+"/"+path+"\"")
+### LUA import statement adding
 
-def addtopimport(base,path):
-    with open(base,'r+',encoding='utf-8') as basefile:
-        lines = basefile.readlines()     
-        lines.insert(0, "Import "+"\""+modsrel+"/"+path+"\"\n")  
-        basefile.seek(0)                 
-        basefile.writelines(lines)
+def addimports(base,tops=(),bottoms=(),footer=""):
+    #every import of a target and its footer go in one atomic write
+    with open(base,'r',encoding='utf-8',newline='') as basefile:
+        data = basefile.read()
+    #the file is kept as is, what is added gets the platform's line endings
+    #each top import lands above the ones before it
+    head = "".join("Import "+"\""+modsrel+"/"+path+"\""+os.linesep for path in reversed(tops))
+    tail = "".join(os.linesep+"Import "+"\""+modsrel+"/"+path+"\"" for path in bottoms)
+    tpath = base+'.'+str(os.getpid())
+    with open(tpath,'w',encoding='utf-8',newline='') as tfile:
+        tfile.write(head+data+tail+footer.replace("\n",os.linesep))
+    copymode(base,tpath)
+    os.replace(tpath,base)
 
 ### XML mapping
 
@@ -119,42 +134,118 @@ def readxml(filename):
     except xml.ParseError:
         return DNE
 
+class xmlstyler():
+    """ applies the indentation styling to streamed ElementTree output """
+    special = re.compile('["<> \t]')
+    flush = 1024
+
+    def __init__(self,file,start=None):
+        self.file = file
+        self.out = [start] if start else []
+        self.line = []
+        self.count = 0
+        self.styling = False
+        self.cr = False
+        self.i = 0
+        self.q = True
+        self.p = ''
+
+    def write(self,chunk):
+        # same text as ElementTree.write(filename) read back in text mode
+        chunk = chunk.encode('ascii','xmlcharrefreplace').decode('ascii')
+        if self.cr and chunk[:1]=='\n':
+            chunk = chunk[1:]
+        if not chunk:
+            return
+        self.cr = chunk[-1]=='\r'
+        chunk = chunk.replace('\r\n','\n').replace('\r','\n')
+        lines = chunk.split('\n')
+        for line in lines[:-1]:
+            self.feed(line+'\n')
+            self.line = []
+            self.count = 0
+            self.styling = False
+        if lines[-1]:
+            self.feed(lines[-1])
+
+    def feed(self,part):
+        # a line is only styled once it has more than one non-blank
+        # character, from then on it is styled as it arrives
+        if not self.styling:
+            self.count += len(part.replace('\t','').replace(' ',''))
+            if self.count <= 1:
+                self.line.append(part)
+                return
+            self.styling = True
+            self.q = True
+            self.p = ''
+            part = ''.join(self.line)+part
+            self.line = []
+        self.style(part)
+
+    def close(self):
+        self.file.write(''.join(self.out))
+        self.out = []
+
+    def trim(self):
+        # drop the last character written, only the last chunk is ever trimmed
+        out = self.out
+        if out:
+            out[-1] = out[-1][:-1]
+            if not out[-1]:
+                out.pop()
+
+    def style(self,line):
+        out = self.out
+        search = self.special.search
+        i = self.i
+        q = self.q
+        p = self.p
+        n = len(line)
+        k = 0
+        while k<n:
+            s = line[k]
+            if s not in '"<> \t' and p not in ('<',' ',''):
+                # nothing happens until the next special character
+                m = search(line,k)
+                e = m.start() if m else n
+                out.append(line[k:e])
+                p = line[e-1]
+                k = e
+                continue
+            if s == '\"':
+                q = not q
+            if p == '<' and q:
+                if s == '/':
+                    i-=1
+                    self.trim()
+                else:
+                    i+=1
+                out.append(p)
+            if s == '>' and p == '/' and q:
+                i-=1
+            if p in (' ') or (s=='>' and p == '\"') and q:
+                out.append('\n'+'\t'*(i-(s=='/')))
+            if s not in (' ','\t','<') or not q:
+                out.append(s)
+            p = s
+            k+=1
+        self.i = i
+        self.q = q
+        self.p = p
+        if len(out)>self.flush:
+            self.file.write(''.join(out[:-1]))
+            del out[:-1]
+
 def writexml(filename,content,start=None):
     if not isinstance(filename,str):
         return
     if not isinstance(content, xml.ElementTree):
         return
-    content.write(filename)
-
-    #indentation styling
-    data = ""
-    if start:
-        data = start
-    with open(filename,'r',encoding='utf-8') as file:
-        i = 0
-        for line in file:
-            nl = False
-            if len(line.replace('\t','').replace(' ',''))>1:
-                q=True
-                p=''
-                for s in line:
-                    if s == '\"':
-                        q = not q
-                    if p == '<' and q:
-                        if s == '/':
-                            i-=1
-                            data = data[:-1]
-                        else:
-                            i+=1
-                        data+=p
-                    if s == '>' and p == '/' and q:
-                        i-=1
-                    if p in (' ') or (s=='>' and p == '\"') and q:
-                        data+='\n'+'\t'*(i-(s=='/'))
-                    if s not in (' ','\t','<') or not q:
-                        data+=s
-                    p=s
-    open(filename,'w',encoding='utf-8').write(data)
+    with open(filename,'w',encoding='utf-8') as file:
+        styler = xmlstyler(file,start)
+        content.write(styler,encoding='unicode')
+        styler.close()
 
 def xmlmap(indata,mapdata):
     if mapdata is DNE:
@@ -170,20 +261,24 @@ def xmlmap(indata,mapdata):
                 indata._setroot(root)
             return indata
         elif isinstance(mapdata,xml.Element):
-            mtags = dict()
-            for v in mapdata:
-                if not mtags.get(v.tag,False):
-                    mtags[v.tag]=True
-            for tag in mtags:
-                mes = mapdata.findall(tag)
-                ies = indata.findall(tag)
+            # one pass over each element's children, indexed by tag
+            mtags = defaultdict(list)
+            for me in mapdata:
+                mtags[me.tag].append(me)
+            itags = defaultdict(list)
+            for ie in indata:
+                if ie.tag in mtags:
+                    itags[ie.tag].append(ie)
+            removed = set()
+            for tag,mes in mtags.items():
+                ies = itags[tag]
                 for i,me in enumerate(mes):
                     ie = safeget(ies,i)
                     if ie is DNE:
                         indata.append(me)
                         continue
                     if me.get(reserved_delete,None) not in (None,'0','false','False'):
-                        indata.remove(ie)
+                        removed.add(ie)
                         continue
                     if me.get(reserved_replace,None) not in (None,'0','false','False'):
                         ie.text = me.text
@@ -195,13 +290,15 @@ def xmlmap(indata,mapdata):
                     ie.tail = xmlmap(ie.tail,me.tail)
                     ie.attrib = xmlmap(ie.attrib,me.attrib)
                     xmlmap(ie,me)
+            if removed:
+                indata[:] = [ie for ie in indata if ie not in removed]
             return indata
         return mapdata
     else:
         return mapdata
     return mapdata
 
-def mergexml(infile,mapfile):
+def mergexml(infile,*mapfiles):
     start = ""
     with open(infile,'r',encoding='utf-8') as file:
         for line in file:
@@ -209,11 +306,9 @@ def mergexml(infile,mapfile):
                 start = line
                 break
     indata = readxml(infile)
-    if mapfile:
-        mapdata = readxml(mapfile)
-    else:
-        mapdata = DNE
-    indata = xmlmap(indata,mapdata)
+    for mapfile in mapfiles:
+        if mapfile:
+            indata = xmlmap(indata,readxml(mapfile))
     writexml(infile,indata,start)
 
 ### SJSON mapping
@@ -230,63 +325,79 @@ if can_sjson:
     def writesjson(filename,content):
         if not isinstance(filename,str):
             return
-        if isinstance(content,OrderedDict):
-            content = sjson.dumps(content, 2)
-        else:
-            content = ""
         with open(filename,'w',encoding='utf-8') as f:
-            f.write(content)
+            if isinstance(content,OrderedDict):
+                sjson.dump(content,f,2,pretty=True)
 
     def sjsonmap(indata,mapdata):
+        #walked with a stack so deep files can't hit the recursion limit,
+        #only the containers the map visits can hold DNE and each is
+        #compacted once its children are done
         if mapdata is DNE:
             return indata
-        if safeget(mapdata,reserved_sequence):
-            S = []
-            for k,v in mapdata.items():
-                try:
-                    d = int(k)-len(S)
-                    if d>=0:
-                        S.extend([DNE]*(d+1))
-                    S[int(k)]=v
-                except ValueError:
-                    continue
-            mapdata = S
-        if type(indata)==type(mapdata):
-            if safeget(mapdata,0)!=reserved_append or isinstance(mapdata,OrderedDict):
-                if isinstance(mapdata,list):
-                    if safeget(mapdata,0)==reserved_delete:
-                        return DNE
-                    if safeget(mapdata,0)==reserved_replace:
-                        del mapdata[0]
-                        return mapdata
-                    indata.extend([DNE]*(len(mapdata)-len(indata)))
-                    for k,v in enumerate(mapdata):
-                        indata[k] = sjsonmap(safeget(indata,k),v)
-                elif isinstance(mapdata,dict):
-                    if safeget(mapdata,reserved_delete):
-                        return DNE
-                    if safeget(mapdata,reserved_replace):
-                        del mapdata[reserved_replace]
-                        return mapdata
-                    for k,v in mapdata.items():
-                        indata[k] = sjsonmap(safeget(indata,k),v)
-                return indata
-            elif isinstance(mapdata,list):
-                for i in range(1,len(mapdata)):
-                    indata.append(mapdata[i])
-                return indata
-        else:
-            return mapdata
-        return mapdata
+        root = [indata]
+        stack = [(root,0,mapdata)]
+        while stack:
+            parent,key,mapdata = stack.pop()
+            if parent is None:
+                compactDNE(key)
+                continue
+            indata = safeget(parent,key)
+            if safeget(mapdata,reserved_sequence):
+                S = []
+                for k,v in mapdata.items():
+                    try:
+                        d = int(k)-len(S)
+                        if d>=0:
+                            S.extend([DNE]*(d+1))
+                        S[int(k)]=v
+                    except ValueError:
+                        continue
+                mapdata = S
+            if type(indata)==type(mapdata):
+                if safeget(mapdata,0)!=reserved_append or isinstance(mapdata,OrderedDict):
+                    if isinstance(mapdata,list):
+                        if safeget(mapdata,0)==reserved_delete:
+                            parent[key] = DNE
+                            continue
+                        if safeget(mapdata,0)==reserved_replace:
+                            del mapdata[0]
+                            parent[key] = compactDNE(mapdata)
+                            continue
+                        indata.extend([DNE]*(len(mapdata)-len(indata)))
+                        stack.append((None,indata,None))
+                        stack.extend((indata,k,mapdata[k])
+                                     for k in reversed(range(len(mapdata)))
+                                     if mapdata[k] is not DNE)
+                    elif isinstance(mapdata,dict):
+                        if safeget(mapdata,reserved_delete):
+                            parent[key] = DNE
+                            continue
+                        if safeget(mapdata,reserved_replace):
+                            del mapdata[reserved_replace]
+                            parent[key] = mapdata
+                            continue
+                        stack.append((None,indata,None))
+                        stack.extend((indata,k,v)
+                                     for k,v in reversed(mapdata.items())
+                                     if v is not DNE)
+                    else:
+                        parent[key] = mapdata
+                elif isinstance(mapdata,list):
+                    for i in range(1,len(mapdata)):
+                        if mapdata[i] is not DNE:
+                            indata.append(mapdata[i])
+            else:
+                parent[key] = compactDNE(mapdata)
+        return root[0]
         
-    def mergesjson(infile,mapfile):
+    def mergesjson(infile,*mapfiles):
         indata = readsjson(infile)
-        if mapfile:
-            mapdata = readsjson(mapfile)
-        else:
-            mapdata = DNE
-        indata = sjsonmap(indata,mapdata)
-        indata = clearDNE(indata)
+        for mapfile in mapfiles:
+            if mapfile:
+                #DNE is cleared as part of the map, so list indices
+                #of later maps refer to the cleaned list
+                indata = sjsonmap(indata,readsjson(mapfile))
         writesjson(infile,indata)
 
 ## FILE/MOD CONTROL
@@ -338,57 +449,105 @@ def valid_scan(file):
             return True
     return False
 
-def splitlines(body):
-    glines = map(lambda s: s.strip().split("\""),body.split("\n"))
-    lines = []
-    li = -1
-    mlcom = False
-    def gp(group,lines,li,mlcom,even):
-        if mlcom:
-            tgroup = group.split(mlcom_end,1)
-            if len(tgroup)==1: #still commented, carry on
-                even = not even
-                return (lines,li,mlcom,even)
-            else: #comment ends, if a quote, even is disrupted
-                even = False
-                mlcom = False
-                group = tgroup[1]
-        if even:
-            lines[li]+="\""+group+"\""
+#same lexer as SGGMI's modfile_lex, without the token offsets
+#a line comment takes precedence over a block comment it overlaps
+mlcom_open = ''.join('(?!'+'.'*i+re.escape(comment)+')'
+    for i in range(1,len(mlcom_start)))+re.escape(mlcom_start)
+stops = (re.escape(comment),mlcom_open,re.escape(linebreak))
+firsts = re.escape(''.join({comment[0],mlcom_start[0],linebreak[0]}))
+lexer = re.compile('|'.join((
+    '(?P<text>(?:[^"\\n'+firsts+']+|(?!'+'|'.join(stops)+')[^"\\n])+)',
+    '(?P<quote>"(?P<quoted>[^"\\n]*)(?P<close>"?))',
+    '(?P<comment>'+re.escape(comment)+'[^"\\n]*)',
+    '(?P<mlcom>'+mlcom_open+')',
+    '(?P<newline>\\n)',
+    '(?P<linebreak>'+re.escape(linebreak)+')',
+)))
+simple = re.compile('(?P<text>(?:[^"\\n'+firsts+']+|"[^"\\n]*"?|'
+    +re.escape(comment)+'[^"\\n]*|(?!'+'|'.join(stops)+')[^"\\n])*)'
+    +'(?:(?P<mlcom>'+mlcom_open+')|'+re.escape(linebreak)+'|\\n|\\Z)')
+mlcom_part = re.compile('(?:(?!'+re.escape(comment)+')[^"\\n])*?(?P<end>'
+    +re.escape(mlcom_end)+')|[^"\\n]*')
+mlcom_rest = re.compile('[^\\n]*?(?P<end>'+re.escape(mlcom_end)+')|[^\\n]*')
+splitter = re.compile('[^ '+re.escape(delimiter)+']+')
+words = re.compile('"([^"]*)"?|([^" '+re.escape(delimiter)+']+)')
+
+def lexstatement(pieces):
+    #text pieces next to each other are one text, as a block comment is
+    #dropped from the middle of a word, whitespace is only stripped at the ends
+    runs = []
+    for text,quoted in pieces:
+        if not quoted and runs and not runs[-1][1]:
+            runs[-1][0] += text
         else:
-            tgroup = group.split(comment,1)
-            tline = tgroup[0].split(mlcom_start,1)
-            tgroup = tline[0].split(linebreak)
-            lines[li]+=tgroup[0] #uncommented line
-            for g in tgroup[1:]: #new uncommented lines
-                lines.append(g)
-                li+=1
-            if len(tline)>1: #comment begins
-                mlcom = True
-                lines,li,mlcom,even = gp(tline[1],lines,li,mlcom,even)
-        return (lines,li,mlcom,even)
-    for groups in glines:
-        even = False
-        li += 1
-        lines.append("")
-        for group in groups:
-            lines,li,mlcom,even = gp(group,lines,li,mlcom,even)
-            even = not even
-    return lines
-
-def tokenise(line):
-    groups = line.strip().split("\"")
-    for i,group in enumerate(groups):
-        if i%2:
-            groups[i] = [group]
-        else:
-            groups[i] = group.replace(" ",delimiter).split(delimiter)
+            runs.append([text,quoted])
     tokens = []
-    for group in groups:
-        for x in group:
-            if x != '':
-                tokens.append(x)
-    return tokens
+    for i,(text,quoted) in enumerate(runs):
+        if quoted:
+            if text:
+                tokens.append(text)
+            continue
+        if i == 0:
+            text = text.lstrip()
+        if i == len(runs)-1:
+            text = text.rstrip()
+        tokens.extend(splitter.findall(text))
+    if tokens:
+        yield tokens
+
+def lexpieces(body,pos):
+    #lexes the statement at pos piece by piece, yielding it and any statement
+    #a newline in one of its block comments ended, returns where the next
+    #statement starts
+    pieces = []
+    while pos < len(body):
+        m = lexer.match(body,pos)
+        kind = m.lastgroup
+        pos = m.end()
+        if kind == 'text':
+            pieces.append((m.group(),False))
+        elif kind == 'quote':
+            text = m.group('quoted')
+            if not m.group('close'):
+                text = text.rstrip()
+            pieces.append((text,True))
+        elif kind == 'mlcom':
+            #a block comment can't end past a line comment in the part of the
+            #line it starts in, past that part quotes and line comments don't
+            #count, but each newline still ends a statement
+            m = mlcom_part.match(body,pos)
+            pos = m.end()
+            while m.group('end') is None and pos < len(body):
+                if body[pos] == '\n':
+                    yield from lexstatement(pieces)
+                    pieces = []
+                m = mlcom_rest.match(body,pos+1)
+                pos = m.end()
+        elif kind != 'comment':
+            break
+    yield from lexstatement(pieces)
+    return pos
+
+def lexmodfile(body):
+    #yields the tokens of each statement, which end at newlines and linebreaks
+    #only statements with block comments are lexed piece by piece, the others
+    #have their line comments cut up to the next quote and are split in one go
+    pos = 0
+    while pos < len(body):
+        m = simple.match(body,pos)
+        if m.group('mlcom') is not None:
+            pos = yield from lexpieces(body,pos)
+            continue
+        text = m.group('text')
+        if comment in text:
+            groups = text.split('"')
+            groups[::2] = [group.split(comment,1)[0] for group in groups[::2]]
+            text = '"'.join(groups)
+        tokens = [quoted or word for quoted,word
+                  in words.findall(text.strip()) if quoted or word]
+        if tokens:
+            yield tokens
+        pos = m.end()
 
 ## FILE/MOD LOADING
 
@@ -438,12 +597,8 @@ def loadmodfile(filename,echo=True):
         to = default_to[game]
         
         with file:    
-            for line in splitlines(file.read()):
-                tokens = tokenise(line) 
-                if len(tokens)==0:
-                    continue
-
-                elif startswith(tokens,kwrd_to,0):
+            for tokens in lexmodfile(file.read()):
+                if startswith(tokens,kwrd_to,0):
                     to = [s.replace("\\","/") for s in tokens[1:]]
                     if len(to) == 0:
                         to = default_to[game]
@@ -476,11 +631,12 @@ def loadmodfile(filename,echo=True):
                     loadcommand(reldir,tokens[len(kwrd_sjson):],to,1,mode_sjson,ep=ep)
 
 def isedited(base):
-    with open(base,'r',encoding='utf-8') as basefile:
-        for line in basefile:
-              if modified+modified_modrep in line:
-                  return True
-    return False
+    #the marker is always the last line written, so only the tail is read
+    with open(base,'rb') as basefile:
+        basefile.seek(0,os.SEEK_END)
+        basefile.seek(max(0,basefile.tell()-modified_tail))
+        tail = basefile.read().decode('utf-8','replace')
+    return modified+modified_modrep in tail
          
 def sortmods(base,mods):
     codes[base].sort(key=lambda x: x.ep)
@@ -497,25 +653,6 @@ def makeedit(base,mods,echo=True):
         i=0
         print("\n"+base)
 
-    try:
-        for mod in mods:
-            if mod.mode == mode_lua:
-                addimport(base,mod.data[0])
-            elif mod.mode == mode_lua_alt:
-                addtopimport(base,mod.data[0])
-            elif mod.mode == mode_xml:
-                mergexml(base,mod.data[0])
-            elif mod.mode == mode_sjson:
-                mergesjson(base,mod.data[0])
-            if echo:
-                k = i+1
-                for s in mod.src.split('\n'):
-                    i+=1
-                    print(" #"+str(i)+" +"*(k<i)+" "*((k>=i)+5-len(str(i)))+s)
-    except Exception as e:
-        copyfile(bakdir+"/"+base+baktype,base)
-        raise RuntimeError("Encountered uncaught exception while implementing mod changes") from e
-
     modifiedstr = ""
     if mods[0].mode in {mode_lua,mode_lua_alt}:
         modifiedstr = "\n"+modified_lua
@@ -523,8 +660,62 @@ def makeedit(base,mods,echo=True):
         modifiedstr = "\n"+modified_xml
     elif mods[0].mode == mode_sjson:
         modifiedstr = "\n"+modified_sjson
-    with open(base,'a',encoding='utf-8') as basefile:
-        basefile.write(modifiedstr.replace(modified,modified+modified_modrep+str(datetime.now())))
+    modifiedstr = modifiedstr.replace(modified,modified+modified_modrep+str(datetime.now()))
+
+    try:
+        #consecutive mods of the same mode are merged with one read/write,
+        #top and bottom imports don't interfere so they share a write
+        groups = groupby(mods,key=lambda mod: mode_lua if mod.mode == mode_lua_alt else mod.mode)
+        groups = [(mode,list(group)) for mode,group in groups]
+        for n,(mode,group) in enumerate(groups):
+            if mode == mode_lua:
+                if n == len(groups)-1:
+                    footer,modifiedstr = modifiedstr,""
+                else:
+                    footer = ""
+                addimports(base,
+                           [mod.data[0] for mod in group if mod.mode == mode_lua_alt],
+                           [mod.data[0] for mod in group if mod.mode == mode_lua],
+                           footer)
+            elif mode == mode_xml:
+                mergexml(base,*(mod.data[0] for mod in group))
+            elif mode == mode_sjson:
+                mergesjson(base,*(mod.data[0] for mod in group))
+            if echo:
+                for mod in group:
+                    k = i+1
+                    for s in mod.src.split('\n'):
+                        i+=1
+                        print(" #"+str(i)+" +"*(k<i)+" "*((k>=i)+5-len(str(i)))+s)
+    except Exception as e:
+        copyfile(bakdir+"/"+base+baktype,base)
+        raise RuntimeError("Encountered uncaught exception while implementing mod changes") from e
+
+    if modifiedstr:
+        with open(base,'a',encoding='utf-8') as basefile:
+            basefile.write(modifiedstr)
+
+def editworker(base,mods,echo=True):
+    #output is collected so the parent can print each target in order
+    out = io.StringIO()
+    with redirect_stdout(out):
+        try:
+            makeedit(base,mods,echo)
+        except Exception:
+            return out.getvalue(),traceback.format_exc()
+    return out.getvalue(),None
+
+def parallelmakeedit(targets,echo=True):
+    failed = []
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = [(base,pool.submit(editworker,base,mods,echo)) for base,mods in targets]
+        for base,future in futures:
+            output,error = future.result()
+            print(output,end='')
+            if error:
+                print(error,end='')
+                failed.append(base)
+    return failed
 
 def cleanup(folder=bakdir,echo=True):
     if valid_scan(folder):
@@ -564,14 +755,32 @@ def start():
     print("\nModified files for "+game+" mods:")
     for base, mods in codes.items():
         sortmods(base,mods)
-        makeedit(base,mods)
+    failed = []
+    if jobs > 1 and len(codes) > 1:
+        #a failed target is rolled back on its own, the others still finish
+        failed = parallelmakeedit(codes.items())
+    else:
+        for base, mods in codes.items():
+            makeedit(base,mods)
 
     bs = len(codes)
     ms = sum(map(len,codes.values()))
 
     print("\n"+str(bs)+" base file"+"s"*(bs!=1)+" import"+"s"*(bs==1)+" a total of "+str(ms)+" mod file"+"s"*(ms!=1)+".")
 
+    if failed:
+        raise RuntimeError("Encountered uncaught exceptions while implementing mod changes for: "+", ".join(failed))
+
 if __name__ == '__main__':
+    #only the main process logs, spawned -j workers import this module
+    #again and would truncate the log
+    logging.basicConfig(filename="modimporter.log.txt",filemode='w')
+    opts,_ = getopt(sys.argv[1:],'j:',['jobs='])
+    for k,v in opts:
+        if k in {'-j','--jobs'}:
+            jobs = int(v)
+            if jobs < 1:
+                jobs = os.cpu_count() or 1
     try:
         start()
     except Exception as e:
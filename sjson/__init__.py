@@ -4,15 +4,46 @@
 # @author: paradigmsort
 # @license: 3-clause BSD
 
+import bisect
 import collections.abc
 import collections
 import numbers
 import string
 import io
+import re
+import sys
 
 __version__ = '2.0.3'
 
 
+Location = collections.namedtuple('Location', ['line', 'column'])
+
+
+class LineIndex:
+    """Maps offsets in a buffer to line/column locations.
+
+    The offsets of all newlines are collected on the first lookup, after
+    which every lookup is a binary search."""
+    def __init__(self, s):
+        """
+        s -- a bytes object.
+        """
+        self._stream = s
+        self._newlines = None
+
+    def get_location(self, index):
+        """Get the location of the byte at ``index``."""
+        if self._newlines is None:
+            self._newlines = [m.start() for m in re.finditer(b'\n',
+                                                             self._stream)]
+        line = bisect.bisect_left(self._newlines, index)
+        if line:
+            line_start = self._newlines[line-1] + 1
+        else:
+            line_start = 0
+        return Location(line + 1, index - line_start + 1)
+
+
 class MemoryInputStream:
     """Input stream wrapper for reading directly from memory."""
     def __init__(self, s):
@@ -22,6 +53,7 @@ class MemoryInputStream:
         self._stream = s
         self._current_index = 0
         self._length = len(s)
+        self._line_index = LineIndex(s)
 
     def read(self, count=1):
         """read ``count`` bytes from the stream."""
@@ -50,18 +82,7 @@ class MemoryInputStream:
 
     def get_location(self):
         """Get the current location in the stream."""
-        loc = collections.namedtuple('Location', ['line', 'column'])
-        bytes_read = self._stream[:self._current_index]
-        line = 1
-        column = 1
-        for byte in bytes_read:
-            # We test the individual bytes here, must use ord
-            if byte == ord('\n'):
-                line += 1
-                column = 1
-            else:
-                column += 1
-        return loc(line, column)
+        return self._line_index.get_location(self._current_index)
 
 
 class ByteBufferInputStream:
@@ -105,8 +126,7 @@ class ByteBufferInputStream:
 
     def get_location(self):
         """Get the current location in the stream."""
-        loc = collections.namedtuple('Location', ['line', 'column'])
-        return loc(self._line, self._column)
+        return Location(self._line, self._column)
 
 
 class ParseException(RuntimeError):
@@ -368,26 +388,452 @@ def _parse(stream):
         raise ParseException('Invalid character', stream.get_location())
 
 
-def load(stream):
-    """Load a SJSON object from a stream."""
-    return _decode_dict(ByteBufferInputStream(io.BufferedReader(stream)))
+_WHITESPACE_RE = re.compile(rb'[ \t\n\r]*')
+_IDENTIFIER_RE = re.compile(rb'[A-Za-z0-9_]*')
+_NUMBER_RE = re.compile(rb'[^ \t\n\r,\]}]*')
+_STRUCTURE_RE = re.compile(rb'[^"{}\[\]/]*')
+
+
+class Span:
+    """A dictionary or list of a lazily loaded document that has not been
+    parsed yet.
+
+    Spans are written back verbatim by the encoder, so untouched parts of a
+    document keep their original formatting."""
+    __slots__ = ('_scanner', 'start', 'end')
+
+    def __init__(self, scanner, start, end):
+        self._scanner = scanner
+        self.start = start
+        self.end = end
+
+    def decode(self):
+        """Parse the container. Containers nested in it are spans again."""
+        if self._scanner._buffer[self.start] == 0x7b:  # '{'
+            return self._scanner.scan_dict(self.start, True)[0]
+        return self._scanner.scan_list(self.start)[0]
+
+    def raw(self):
+        """Get the original text of the container."""
+        return str(self._scanner._buffer[self.start:self.end],
+                   encoding='utf-8')
+
+
+class Shape:
+    """The key table shared by records with the same keys in the same order.
+
+    Adding or removing a key moves a record to another shape, which is kept
+    by the shape it came from, so records edited the same way keep sharing
+    their tables."""
+    __slots__ = ('keys', 'index', '_added', '_removed')
+
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self._added = {}
+        self._removed = {}
+
+    def add(self, key):
+        """Get the shape with ``key`` appended."""
+        shape = self._added.get(key)
+        if shape is None:
+            shape = self._added[key] = Shape(self.keys + (key,))
+        return shape
+
+    def remove(self, key):
+        """Get the shape without ``key``."""
+        shape = self._removed.get(key)
+        if shape is None:
+            i = self.index[key]
+            shape = self._removed[key] = Shape(self.keys[:i] + self.keys[i+1:])
+        return shape
+
+    def __reduce__(self):
+        return Shape, (self.keys,)
+
+
+class Record(collections.abc.MutableMapping):
+    """An insertion-ordered dictionary whose keys are held by a shared
+    :class:`Shape`, so each record only stores its list of values.
+
+    Records are what dictionaries in a list of dictionaries become when a
+    document is loaded with ``records=True``."""
+    __slots__ = ('_shape', '_values')
+
+    def __init__(self, shape, values):
+        self._shape = shape
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._shape.index[key]]
+
+    def get(self, key, default=None):
+        i = self._shape.index.get(key)
+        if i is None:
+            return default
+        return self._values[i]
+
+    def __setitem__(self, key, value):
+        i = self._shape.index.get(key)
+        if i is None:
+            self._shape = self._shape.add(key)
+            self._values.append(value)
+        else:
+            self._values[i] = value
+
+    def __delitem__(self, key):
+        i = self._shape.index[key]
+        self._shape = self._shape.remove(key)
+        del self._values[i]
+
+    def __contains__(self, key):
+        return key in self._shape.index
+
+    def __iter__(self):
+        return iter(self._shape.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def keys(self):
+        return list(self._shape.keys)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return list(zip(self._shape.keys, self._values))
+
+    def copy(self):
+        return Record(self._shape, list(self._values))
+
+    def __repr__(self):
+        return 'Record({!r})'.format(dict(self.items()))
+
+    def __reduce__(self):
+        return Record, (self._shape, self._values)
+
+
+class BufferScanner:
+    """Scanner working on a whole in-memory buffer.
 
+    Instead of peeking at the input one byte at a time, the scanner keeps an
+    index into the buffer and uses compiled patterns and ``bytes.find`` to
+    jump over whitespace, comments, identifiers, numbers and strings. It
+    produces the same values and raises the same :class:`ParseException`
+    locations as the stream reader.
 
-def loads(text):
-    """Load a SJSON object from a string."""
-    return _decode_dict(MemoryInputStream(text.encode('utf-8')))
+    In lazy mode, containers nested in the dictionary or list being scanned
+    are only skipped over and returned as :class:`Span` objects.
 
+    In records mode, dictionaries are plain ``dict`` objects with interned
+    keys, and the dictionaries of a list of dictionaries become
+    :class:`Record` objects sharing one :class:`Shape` per key sequence."""
+    def __init__(self, s, lazy=False, records=False):
+        """
+        s -- a bytes object.
+        lazy -- if ``True``, nested containers are returned as spans.
+        records -- if ``True``, use the compact dictionary representation.
+        """
+        self._buffer = s
+        self._length = len(s)
+        self._line_index = LineIndex(s)
+        self._lazy = lazy
+        self._records = records
+        self._shapes = {}
+
+    def get_location(self, index):
+        """Get the location of ``index`` in the buffer."""
+        return self._line_index.get_location(index)
+
+    def _raise_end_of_file_exception(self, index):
+        raise ParseException('Unexpected end-of-stream',
+                             self.get_location(index))
+
+    def skip_whitespace(self, index):
+        """Skip whitespace and comments starting at ``index``. Returns the
+        index of the next significant byte."""
+        buffer = self._buffer
+        while True:
+            index = _WHITESPACE_RE.match(buffer, index).end()
+            if buffer[index:index+1] != b'/':
+                return index
+            comment_start = buffer[index+1:index+2]
+            if comment_start == b'*':
+                index = self._skip_c_style_comment(index)
+            elif comment_start == b'/':
+                index = buffer.find(b'\n', index + 2)
+                if index < 0:
+                    return self._length
+            else:
+                return index
+
+    def _skip_c_style_comment(self, index):
+        # Like the stream reader, a '*' that does not close the comment
+        # also swallows the byte that follows it.
+        buffer = self._buffer
+        position = index + 2
+        while True:
+            position = buffer.find(b'*', position)
+            if position < 0:
+                raise ParseException("Could not find closing '*/' for comment",
+                                     self.get_location(index))
+            if buffer[position+1:position+2] == b'/':
+                return position + 2
+            position += 2
+
+    def _consume(self, index, what):
+        end = index + len(what)
+        if end > self._length:
+            self._raise_end_of_file_exception(index)
+        if self._buffer[index:end] != what:
+            raise ParseException("Expected to read '{}'".format(what),
+                                 self.get_location(index))
+        return end
+
+    def scan_string(self, index, allow_identifier=False):
+        """Scan a quoted string, raw string or identifier at ``index``.
+        Returns the value and the index after it."""
+        buffer = self._buffer
+        if index >= self._length:
+            self._raise_end_of_file_exception(index)
+
+        if buffer[index] != 0x22:  # '"'
+            if not allow_identifier:
+                raise ParseException('Quoted string expected',
+                                     self.get_location(index))
+            end = _IDENTIFIER_RE.match(buffer, index).end()
+            if end >= self._length:
+                self._raise_end_of_file_exception(self._length)
+            return buffer[index:end].decode('ascii'), end
+
+        if index + 3 > self._length:
+            self._raise_end_of_file_exception(index)
+        if buffer.startswith(b'"""', index):
+            start = index + 3
+            end = buffer.find(b'"""', start)
+            if end < 0:
+                self._raise_end_of_file_exception(
+                    max(start, self._length - 2))
+            # defer encoding so we can tell the difference
+            return bytearray(buffer[start:end]), end + 3
+
+        start = index + 1
+        end = buffer.find(b'"', start)
+        if end < 0:
+            self._raise_end_of_file_exception(self._length)
+        return str(buffer[start:end], encoding='utf-8'), end + 1
+
+    def scan_number(self, index):
+        """Scan a number at ``index``. Returns the value and the index after
+        it."""
+        end = _NUMBER_RE.match(self._buffer, index).end()
+        number_bytes = self._buffer[index:end]
+        try:
+            value = number_bytes.decode('utf-8')
+            if b'.' in number_bytes or b'e' in number_bytes \
+                    or b'E' in number_bytes:
+                return float(value), end
+            return int(value), end
+        except ValueError:
+            raise ParseException('Invalid character', self.get_location(end))
+
+    def scan_dict(self, index, delimited=False):
+        """Scan a dictionary at ``index``. Returns the value and the index
+        after it.
+
+        delimited -- if ``True``, parsing will stop once the
+                     end-of-dictionary delimiter has been reached(``}``)
+        """
+        from collections import OrderedDict
+        records = self._records
+        result = {} if records else OrderedDict()
+        buffer = self._buffer
+        skip_whitespace = self.skip_whitespace
+
+        index = skip_whitespace(index)
+        if buffer[index:index+1] == b'{':
+            index = skip_whitespace(index + 1)
+
+        while True:
+            next_char = buffer[index:index+1]
+            if not delimited and not next_char:
+                break
+
+            if next_char == b'}':
+                index += 1
+                break
+
+            key, index = self.scan_string(index, True)
+            if records:
+                key = sys.intern(key)
+            index = skip_whitespace(index)
+            # We allow both '=' and ':' as separators inside maps
+            next_char = buffer[index:index+1]
+            if next_char == b'=' or next_char == b':':
+                index += 1
+            value, index = self.scan(index)
+            result[key] = value
+
+            index = skip_whitespace(index)
+            if buffer[index:index+1] == b',':
+                index = skip_whitespace(index + 1)
+
+        return result, index
+
+    def scan_list(self, index):
+        """Scan a list at ``index``. Returns the value and the index after
+        it."""
+        result = []
+        buffer = self._buffer
+        skip_whitespace = self.skip_whitespace
+
+        # skip '['
+        index = skip_whitespace(index + 1)
+        while True:
+            if buffer[index:index+1] == b']':
+                index += 1
+                break
+
+            value, index = self.scan(index)
+            result.append(value)
+
+            index = skip_whitespace(index)
+            if buffer[index:index+1] == b',':
+                index = skip_whitespace(index + 1)
+
+        if self._records and result \
+                and all(type(value) is dict for value in result):
+            shapes = self._shapes
+            for i, value in enumerate(result):
+                keys = tuple(value)
+                shape = shapes.get(keys)
+                if shape is None:
+                    shape = shapes[keys] = Shape(keys)
+                result[i] = Record(shape, list(value.values()))
+        return result, index
+
+    def skip_container(self, index):
+        """Skip the dictionary or list at ``index`` without parsing it.
+        Returns the index after it."""
+        buffer = self._buffer
+        depth = 0
+        while True:
+            index = _STRUCTURE_RE.match(buffer, index).end()
+            next_char = buffer[index:index+1]
+            if not next_char:
+                self._raise_end_of_file_exception(index)
+            elif next_char == b'{' or next_char == b'[':
+                depth += 1
+                index += 1
+            elif next_char == b'}' or next_char == b']':
+                depth -= 1
+                index += 1
+                if depth == 0:
+                    return index
+            elif next_char == b'"':
+                if buffer.startswith(b'"""', index):
+                    index = buffer.find(b'"""', index + 3) + 3
+                else:
+                    index = buffer.find(b'"', index + 1) + 1
+                if index <= 0:
+                    self._raise_end_of_file_exception(self._length)
+            else:
+                comment_start = buffer[index+1:index+2]
+                if comment_start == b'*' or comment_start == b'/':
+                    index = self.skip_whitespace(index)
+                else:
+                    index += 1
+
+    def scan(self, index):
+        """Scan any value at ``index``. Returns the value and the index after
+        it."""
+        index = self.skip_whitespace(index)
+        next_char = self._buffer[index:index+1]
+
+        if next_char == b't':
+            return True, self._consume(index, b'true')
+        elif next_char == b'f':
+            return False, self._consume(index, b'false')
+        elif next_char == b'n':
+            return None, self._consume(index, b'null')
+        elif next_char == b'{' or next_char == b'[':
+            if self._lazy:
+                end = self.skip_container(index)
+                return Span(self, index, end), end
+            if next_char == b'{':
+                return self.scan_dict(index, True)
+            return self.scan_list(index)
+        elif next_char == b'\"':
+            return self.scan_string(index)
+        return self.scan_number(index)
+
+
+def _load_bytes(data, scanner, lazy, records):
+    if lazy and records:
+        # spans are parsed later without the scanner's record shapes
+        raise ValueError("Records cannot be loaded lazily")
+    if scanner == 'buffer':
+        return BufferScanner(data, lazy, records).scan_dict(0)[0]
+    elif scanner == 'stream':
+        if lazy:
+            raise ValueError("The stream scanner cannot load lazily")
+        if records:
+            raise ValueError("The stream scanner cannot load records")
+        return _decode_dict(MemoryInputStream(data))
+    raise ValueError("Unknown scanner '{}'".format(scanner))
+
+
+def load(stream, scanner='buffer', lazy=False, records=False):
+    """Load a SJSON object from a stream.
+
+    scanner -- ``'buffer'`` reads the whole stream and parses it with the
+               :class:`BufferScanner`, ``'stream'`` parses it byte by byte
+               while reading.
+    lazy -- if ``True``, only the top-level dictionary is parsed and the
+            containers in it are :class:`Span` objects.
+    records -- if ``True``, dictionaries are plain dicts with interned keys
+               and lists of dictionaries hold :class:`Record` objects.
+               Cannot be combined with ``lazy``.
+    """
+    if scanner == 'stream' and not lazy and not records:
+        return _decode_dict(ByteBufferInputStream(io.BufferedReader(stream)))
+    return _load_bytes(stream.read(), scanner, lazy, records)
+
+
+def loads(text, scanner='buffer', lazy=False, records=False):
+    """Load a SJSON object from a string.
+
+    scanner -- ``'buffer'`` parses with the :class:`BufferScanner`,
+               ``'stream'`` with the byte-wise :class:`MemoryInputStream`
+               reader.
+    lazy -- if ``True``, only the top-level dictionary is parsed and the
+            containers in it are :class:`Span` objects.
+    records -- if ``True``, dictionaries are plain dicts with interned keys
+               and lists of dictionaries hold :class:`Record` objects.
+               Cannot be combined with ``lazy``.
+    """
+    return _load_bytes(text.encode('utf-8'), scanner, lazy, records)
 
-def dumps(obj, indent=None):
+
+def dumps(obj, indent=None, pretty=False):
     """Dump an object to a string."""
     import io
     stream = io.StringIO()
-    dump(obj, stream, indent)
+    dump(obj, stream, indent, pretty)
     return stream.getvalue()
 
 
-def dump(obj, fp, indent=None):
-    """Dump an object to a stream."""
+def dump(obj, fp, indent=None, pretty=False):
+    """Dump an object to a stream.
+
+    pretty -- if ``True``, every dictionary entry and list element is put on
+              its own line and nested containers are indented by ``indent``
+              (two spaces by default). The output is written in one pass,
+              in batches of joined chunks.
+    """
+    if pretty and indent is None:
+        indent = 2
     if not indent:
         _indent = ''
     elif isinstance(indent, numbers.Number):
@@ -397,8 +843,18 @@ def dump(obj, fp, indent=None):
     else:
         _indent = indent
 
-    for e in _encode(obj, indent=_indent):
-        fp.write(e)
+    if not pretty:
+        for e in _encode(obj, indent=_indent):
+            fp.write(e)
+        return
+
+    chunks = []
+    for e in _encode_pretty(obj, _indent):
+        chunks.append(e)
+        if len(chunks) >= _DUMP_BATCH_SIZE:
+            fp.write(''.join(chunks))
+            chunks.clear()
+    fp.write(''.join(chunks))
 
 
 def _encode(obj, separators=('', '\n', ' = '), indent=0, level=0):
@@ -422,6 +878,11 @@ def _encode(obj, separators=('', '\n', ' = '), indent=0, level=0):
         yield '"""'
         yield str(obj, 'utf-8')
         yield '"""'
+    # Unparsed container of a lazily loaded document
+    elif isinstance(obj, Span):
+        yield obj.raw()
+    elif isinstance(obj, Record):
+        yield from _encode_dict(obj, separators, indent, level)
     elif isinstance(obj, collections.abc.Sequence):
         yield from _encode_list(obj, separators, indent, level)
     elif isinstance(obj, collections.abc.Mapping):
@@ -488,3 +949,39 @@ def _encode_dict(obj, separators, indent, level):
     yield '\n'
     yield _indent(level, indent)
     yield '}'
+
+
+_DUMP_BATCH_SIZE = 4096
+
+
+def _encode_pretty(obj, indent, level=0):
+    if isinstance(obj, str):
+        yield '"' + obj + '"'
+        return
+    if isinstance(obj, (dict, Record)) \
+            or isinstance(obj, collections.abc.Mapping):
+        opening, closing = '{', '}'
+    elif isinstance(obj, list) or isinstance(obj, collections.abc.Sequence) \
+            and not isinstance(obj, bytearray):
+        opening, closing = '[', ']'
+    else:
+        yield from _encode(obj)
+        return
+
+    if not obj:
+        yield opening + closing
+        return
+
+    yield opening
+    inner = '\n' + _indent(level+1, indent)
+    if opening == '{':
+        for key, value in obj.items():
+            yield inner
+            yield from _encode_key(key)
+            yield ' = '
+            yield from _encode_pretty(value, indent, level+1)
+    else:
+        for element in obj:
+            yield inner
+            yield from _encode_pretty(element, indent, level+1)
+    yield '\n' + _indent(level, indent) + closing
@@ -0,0 +1,187 @@
+import os
+import tempfile
+import unittest
+from collections import defaultdict
+
+import SGGMI
+
+
+class CommandLineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {name: getattr(SGGMI, name)
+                      for name in ('main_action', 'hashes', 'do_plan',
+                                   'profile_run', 'profile_dump')}
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.makedirs(self.tmp.name+'/Game/Content')
+        os.chdir(self.tmp.name+'/Game/Content')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        for name, value in self.saved.items():
+            setattr(SGGMI, name, value)
+
+    def test_hashes(self):
+        calls = []
+        SGGMI.main_action = lambda *args, **kwargs: calls.append(kwargs)
+        SGGMI.main('-H', 'sha1 blake2b:8')
+        postdict = calls[0]['postdict']
+        self.assertEqual(postdict['hashes'], ['sha1', 'blake2b:8'])
+
+        SGGMI.main('--hashes', 'sha256')
+        self.assertEqual(calls[1]['postdict']['hashes'], ['sha256'])
+
+        SGGMI.configure_globals(dict(postdict, log=False, echo=False,
+                                     input=False, profile='T',
+                                     profiles={'T': {'game_dir_path': '..'}}),
+                                flow=False)
+        self.assertEqual(SGGMI.hashes, ['sha1', 'blake2b:8'])
+        with open('file.txt', 'w') as f:
+            f.write('data')
+        modes = [line.split('\t')[0]
+                 for line in SGGMI.hashfile('file.txt').split('\n')]
+        self.assertEqual(modes, ['sha1', 'blake2b:8'])
+
+    def test_one_shot(self):
+        # one-shot options must not end up in a config written with -m
+        calls = []
+        SGGMI.main_action = lambda *args, **kwargs: calls.append(kwargs)
+        SGGMI.main('--plan', 'plan.json')
+        self.assertEqual(calls[0]['postdict'], {})
+        self.assertEqual(SGGMI.do_plan, 'plan.json')
+        self.assertNotIn('plan', SGGMI.YML_framework)
+
+        SGGMI.main('--profile-dump', 'run.prof')
+        self.assertEqual(calls[1]['postdict'], {})
+        self.assertTrue(SGGMI.profile_run)
+        self.assertEqual(SGGMI.profile_dump, 'run.prof')
+        self.assertNotIn('profile_run', SGGMI.YML_framework)
+        self.assertNotIn('profile_dump', SGGMI.YML_framework)
+
+
+class ModfileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {name: getattr(SGGMI, name, None)
+                      for name in ('codes', 'todeploy')}
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.makedirs(self.tmp.name+'/Game/Content')
+        os.chdir(self.tmp.name+'/Game/Content')
+        SGGMI.configure_globals({'log': False, 'echo': False, 'input': False,
+                                 'profile': 'T', 'profiles': {'T': {
+                                     'game_dir_path': '..',
+                                     'default_target': ['Scripts/x.lua']}}},
+                                flow=False)
+        os.makedirs(SGGMI.cachedir)
+        os.makedirs(SGGMI.modsdir)
+        os.makedirs('Scripts')
+        open('Scripts/x.lua', 'w').close()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        for name, value in self.saved.items():
+            setattr(SGGMI, name, value)
+
+    def write(self, path, text):
+        with open(SGGMI.modsdir+'/'+path, 'w') as f:
+            f.write(text)
+
+    def load(self):
+        SGGMI.codes = defaultdict(list)
+        SGGMI.todeploy = {}
+        SGGMI.modfile_loadall(echo=False)
+        return sorted(mod.src for mod in SGGMI.codes['Scripts/x.lua'])
+
+    def test_included_folder(self):
+        os.makedirs(SGGMI.modsdir+'/ModA/Inc')
+        self.write('ModA/modfile.txt', 'Include "Inc"')
+        self.write('ModA/Inc/one.txt', 'Import "a.lua"')
+        self.write('ModA/Inc/a.lua', '')
+        self.assertEqual(self.load(), ['ModA/Inc/a.lua'])
+        self.assertTrue(os.path.isfile(SGGMI.cachedir+'/modfiles.json'))
+
+        self.write('ModA/Inc/two.txt', 'Import "b.lua"')
+        self.write('ModA/Inc/b.lua', '')
+        # the folder's mtime must change even where timestamps are coarse
+        st = os.stat(SGGMI.modsdir+'/ModA/Inc')
+        os.utime(SGGMI.modsdir+'/ModA/Inc',
+                 ns=(st.st_atime_ns, st.st_mtime_ns+10**9))
+        self.assertEqual(self.load(), ['ModA/Inc/a.lua', 'ModA/Inc/b.lua'])
+
+    def test_cache_out_of_scope(self):
+        # the parse cache sits under Content, but is never mod content
+        self.write('modfile.txt', '')
+        open(SGGMI.cachedir+'/modfiles.json', 'w').close()
+        self.assertEqual(
+            SGGMI.in_scope(SGGMI.cachedir+'/modfiles.json').message, 'InCache')
+        self.assertEqual(SGGMI.in_scope(SGGMI.modsdir+'/modfile.txt').message,
+                         'FileInScope')
+
+
+class SjsonLoadTest(unittest.TestCase):
+
+    def test_lazy_records(self):
+        sjson = SGGMI.sjson
+        if sjson is None:
+            self.skipTest('sjson is not available')
+        text = '{ Texts = [ { Id = "A" } ] }'
+        self.assertIsInstance(sjson.loads(text, records=True)['Texts'][0],
+                              sjson.Record)
+        with self.assertRaises(ValueError):
+            sjson.loads(text, lazy=True, records=True)
+
+
+class ModfileLexTest(unittest.TestCase):
+
+    def lex(self, body):
+        return [list(tokens) for tokens in SGGMI.modfile_lex(body)]
+
+    def test_separators(self):
+        self.assertEqual(self.lex('Import "a b.lua","c" ;To x'),
+                         [['Import', 'a b.lua', 'c'], ['To', 'x']])
+        # only spaces and delimiters separate tokens inside a statement
+        self.assertEqual(self.lex('Import\t"x.lua"'), [['Import\t', 'x.lua']])
+        self.assertEqual(self.lex('\tImport "x.lua"\t\r\n'),
+                         [['Import', 'x.lua']])
+        self.assertEqual(self.lex('Import\t:: comment'), [['Import']])
+
+    def test_unclosed_quote(self):
+        self.assertEqual(self.lex('Import "a b  \r\nTo x'),
+                         [['Import', 'a b'], ['To', 'x']])
+        self.assertEqual(self.lex('Import "   '), [['Import']])
+
+    def test_block_comments(self):
+        self.assertEqual(self.lex('Import a.lua\t-: note :-'),
+                         [['Import', 'a.lua']])
+        self.assertEqual(self.lex('b c\r-:'), [['b', 'c']])
+        # a block comment in a word joins its halves
+        self.assertEqual(self.lex('Import a-: x :-b.lua'),
+                         [['Import', 'ab.lua']])
+        # each newline in a block comment ends a statement
+        self.assertEqual(self.lex('To x -: a\n;b :- y\nc'),
+                         [['To', 'x'], ['y'], ['c']])
+        # quotes in a block comment don't count
+        self.assertEqual(self.lex('a -: " :- "b"'), [['a', 'b']])
+
+    def test_overlapping_comments(self):
+        self.assertEqual(self.lex('-::-:Import:a-: \n'), [['-']])
+        # a block comment can't end past a line comment in its own part
+        self.assertEqual(self.lex('b c-:;-To::-x;y'), [['b', 'c']])
+        self.assertEqual(self.lex('a -: x :: :- b\nc :- d'),
+                         [['a'], ['d']])
+        # a line comment ends at the next quote
+        self.assertEqual(self.lex('Import :: x "y.lua"'),
+                         [['Import', 'y.lua']])
+
+    def test_where(self):
+        statements = list(SGGMI.modfile_lex('To x\nLoad -: c :- Priority 5'))
+        self.assertEqual(statements[0].where(1), '1:4')
+        self.assertEqual(statements[1].where(2), '2:23')
+
+
+if __name__ == '__main__':
+    unittest.main()